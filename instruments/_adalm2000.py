@@ -6,7 +6,9 @@
 # device-indepenedent functionality lives there, and was used in soundcard.py.
 
 import time      as _t
+import math      as _math
 import numpy     as _n
+import concurrent.futures as _futures
 import mcphysics as _mp
 import spinmob   as _s
 import spinmob.egg as _egg
@@ -17,6 +19,89 @@ except: _gt = _mp.instruments._gui_tools
 import traceback as _traceback
 _p = _traceback.print_last
 
+# Short waveform used to zero the analog outputs (shared; don't modify it)
+_zeros4 = _n.zeros(4)
+
+# Choices for the analog input settings. The trigger lists MUST be in this
+# order; their indices are constants defined by libm2k:
+# https://analogdevicesinc.github.io/libm2k/enums_8hpp.html
+_ai_rate_names = ['100 MHz', '10 MHz', '1 MHz', '100 kHz', '10 kHz', '1 kHz']
+_ai_trigger_ins = [
+    'Ch1',
+    'Ch2',
+    'Ch1 or Ch2',
+    'Ch1 and Ch2',
+    'Ch1 xor Ch2',
+    'Digital In',
+    'Ch1 or Logic',
+    'Ch2 or Logic',
+    'Ch1 or Ch2 or Logic']
+_ai_trigger_outs = [
+    'None',
+    'Same Channel',
+    'Trigger In',
+    'Analog In',
+    'Digital In']
+_ai_trigger_modes = [
+    'Immediate',
+    'Analog',
+    'External (TI)',
+    'Digital or Analog',
+    'Digital and Analog',
+    'Digital xor Analog',
+    'N Digital or Analog',
+    'N Digital and Analog',
+    'N Digital xor Analog']
+_ai_trigger_conditions = ['Rising', 'Falling', 'Low Level', 'High Level']
+
+# Lookup tables from the above choices to their rates / libm2k constants
+_ai_rate_values         = dict(zip(_ai_rate_names, [100e6, 100e5, 100e4, 100e3, 100e2, 100e1]))
+_ai_trigger_in_index    = {k:n for n,k in enumerate(_ai_trigger_ins)}
+_ai_trigger_out_index   = {k:n for n,k in enumerate(_ai_trigger_outs)}
+_ai_trigger_mode_index  = {k:n for n,k in enumerate(_ai_trigger_modes)}
+_ai_trigger_condition_index = {k:n for n,k in enumerate(_ai_trigger_conditions)}
+
+def _get_cycles_samples(N1, samples_min, samples_max):
+    """
+    Returns the number of samples, between samples_min and samples_max, that
+    most nearly holds a whole number of cycles N1 samples (float) long. If
+    not even one cycle fits, returns samples_max.
+    """
+    # The goal now is to add an integer number of these cycles up to the
+    # maximum and look for the one with the smallest remainder.
+    max_cycles = int(       samples_max/N1 )
+    min_cycles = _math.ceil(samples_min/N1)
+
+    # Not even one fits. Use the most samples (lowest frequency) we can.
+    if max_cycles < min_cycles: return samples_max
+
+    # If there is only one option, there is nothing to search.
+    if max_cycles == min_cycles: c = 0
+
+    else:
+        # List of options to search
+        options   = _n.arange(min_cycles, max_cycles+1, dtype=_n.float64) * N1 # Possible floats
+
+        # How close each option is to an integer (from the fractional part).
+        frac      = _n.modf(options)[0]
+        residuals = _n.minimum(frac, 1.0-frac)
+
+        # Now we can get the number of cycles (first of the best)
+        c = int(residuals.argmin())
+
+    # Now we can get the number of samples, within the limits
+    N = int(round(N1*(c+min_cycles)))
+    return min(max(N, samples_min), samples_max)
+
+def _is_timeout(e):
+    """
+    Returns True if the exception e is libm2k giving up on waiting for
+    samples (e.g., no trigger), rather than some other error.
+    """
+    timeout_exception = getattr(_mp._libm2k, 'timeout_exception', None)
+    if timeout_exception and isinstance(e, timeout_exception): return True
+    m = str(e).lower()
+    return 'timeout' in m or 'timed out' in m
 
 
 class _adalm2000_object():
@@ -29,18 +114,86 @@ class _adalm2000_object():
         Instance of api returned by, e.g., m2k.getPowerSupply(). If None,
         simulation mode.
     """
+    # Methods to replace with their _<name>_simulation() versions in simulation mode
+    _simulated = []
+
     def __init__(self, api):
         self.more = api
         self.simulation_mode = api == None
 
+        # Swap in the simulated methods once, rather than checking
+        # self.simulation_mode in every call.
+        if self.simulation_mode:
+            for name in self._simulated: setattr(self, name, getattr(self, '_'+name+'_simulation'))
+
 class _adalm2000_analog_in(_adalm2000_object):
+    """
+    Analog input (scope) api.
+
+    Parameters
+    ----------
+    api
+        Instance of api returned by m2k.getAnalogIn(). If None, simulation mode.
+
+    pool=None
+        Single-worker concurrent.futures.ThreadPoolExecutor used by
+        get_samples_async(). If None, one is created when first needed.
+    """
+    _simulated = ['get_sample_rate', 'set_sample_rate', 'get_samples', 'get_samples_raw',
+                  'set_enabled', 'set_range_big', 'set_range_small', 'set_trigger_modes', 'set_trigger_in',
+                  'set_trigger_out', 'set_trigger_conditions', 'get_trigger_levels',
+                  'set_trigger_levels', 'set_and_get_trigger_levels', 'set_trigger_hystereses', 'get_trigger_delay',
+                  'set_trigger_delay']
+
+    def __init__(self, api, pool=None):
+        _adalm2000_object.__init__(self, api)
+        self._pool = pool
+
+        # Trigger handle (saves asking for it on every trigger call)
+        self._trigger = None if api == None else api.getTrigger()
+
+        # Trigger values already sent to the hardware, by (method, channel)
+        self._trigger_sent = dict()
+
+        # Trigger levels read back by set_and_get_trigger_levels(), by channel: (requested, actual)
+        self._trigger_levels = dict()
+
+        # Optional history of the most recent samples (see set_history())
+        self.history = None
+
+        # Noise generator for simulation mode
+        self._rng = _n.random.default_rng()
+
+        # Last requested and actual sample rates (None = unknown)
+        self._sample_rate_requested = None
+        self._sample_rate           = None
+
+        # Bit mask of enabled channels (bit 0 = Ch1, bit 1 = Ch2, None = unknown)
+        self._enabled_mask = None
+
+        # Ranges sent to each channel, and the trigger delay (samples) the
+        # hardware reported (None = unknown)
+        self._ranges        = [None, None]
+        self._trigger_delay = None
+
+    def _set_trigger(self, name, *a):
+        """
+        Calls self._trigger's method name(*a), unless the exact same value
+        was already sent. The acquisition loop re-applies all the trigger
+        settings every iteration, and most of the time nothing has changed.
+        """
+        key = (name,)+a[:-1]
+        if key in self._trigger_sent and self._trigger_sent[key] == a[-1]: return
+        getattr(self._trigger, name)(*a)
+        self._trigger_sent[key] = a[-1]
 
     def get_sample_rate(self):
         """
         Returns the current sample rate (Hz)
         """
-        if self.simulation_mode: return 1e7
-        else:                    return self.more.getSampleRate()
+        # Only ask the hardware if we don't already know
+        if self._sample_rate == None: self._sample_rate = self.more.getSampleRate()
+        return self._sample_rate
 
     def set_sample_rate(self, sample_rate=100e6):
         """
@@ -55,10 +208,12 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         Actual sample rate
         """
-        if not self.simulation_mode:
+        # Only talk to the hardware if this is a new rate
+        if not sample_rate == self._sample_rate_requested:
             self.more.setSampleRate(sample_rate)
-            return self.more.getSampleRate()
-        return sample_rate
+            self._sample_rate_requested = sample_rate
+            self._sample_rate           = self.more.getSampleRate()
+        return self._sample_rate
 
     def get_samples(self, samples=8192):
         """
@@ -77,21 +232,116 @@ class _adalm2000_analog_in(_adalm2000_object):
 
         Returns
         -------
-        List of voltage arrays, one for each channel, or None if there is a timeout.`
+        Tuple of voltage arrays, one for each channel, or None if there is a timeout.
+        The arrays are views of a single block of memory.
+        """
+        # Enable the channels if needed and reset the buffer
+        self._prepare_transfer()
+
+        # Convert the samples to one (2, samples) array, and send back views
+        # of its rows rather than copies. The interleaved versions of this
+        # call return a bare C pointer, which numpy can't use.
+        try: v = _n.array(self.more.getSamples(int(samples)), dtype=_n.float64)
+        except Exception as e:
+            if _is_timeout(e): return None
+            raise
+        V1, V2 = v[0], v[1]
+
+        # Remember them
+        if self.history is not None: self.history.extend(V1, V2)
+        return V1, V2
+
+    def get_samples_raw(self, samples=8192):
+        """
+        Same as get_samples(), but returns the raw (int16) ADC values, which
+        take a quarter of the memory of the voltages. Convert them to volts
+        with, e.g., self.more.convertRawToVolts() or the channel's
+        self.more.getScalingFactor(). These are not added to the history.
+
+        Parameters
+        ----------
+        samples : integer, optional
+            Number of samples to ask for. The default is 8192.
+
+        Returns
+        -------
+        Tuple of int16 arrays, one for each channel, or None if there is a timeout.
+        """
+        # Enable the channels if needed and reset the buffer
+        self._prepare_transfer()
+
+        try: v = _n.array(self.more.getSamplesRaw(int(samples)), dtype=_n.int16)
+        except Exception as e:
+            if _is_timeout(e): return None
+            raise
+        return v[0], v[1]
+
+    def set_enabled(self, enable1, enable2):
+        """
+        Enables / disables the two input channels.
+
+        Parameters
+        ----------
+        enable1 : bool
+            Whether channel 1 is enabled.
+        enable2 : bool
+            Whether channel 2 is enabled.
+
+        Returns
+        -------
+        self
         """
-        if self.simulation_mode: return (_n.random.normal(size=samples), _n.random.normal(size=samples))
+        self.more.enableChannel(0, enable1)
+        self.more.enableChannel(1, enable2)
+        self._enabled_mask = bool(enable1) | bool(enable2) << 1
+        return self
 
-        # If neither are enabled, enable them both.
-        if not self.more.isChannelEnabled(0) and not self.more.isChannelEnabled(1):
-            self.more.enableChannel(0, True)
-            self.more.enableChannel(1, True)
+    def _prepare_transfer(self):
+        """
+        Enables both channels if neither is enabled, and stops any previous
+        acquisition, before asking for samples.
+        """
+        # If neither are enabled, enable them both. Only the first call asks
+        # the hardware; after that we keep track ourselves.
+        if self._enabled_mask == None:
+            self._enabled_mask = self.more.isChannelEnabled(0) | self.more.isChannelEnabled(1) << 1
+        if not self._enabled_mask: self.set_enabled(True, True)
 
         # Stop acquisition ("Destroy the buffer and stop acquisition.")
         self.more.stopAcquisition()
 
-        # Send it back
-        try:    return self.more.getSamples(int(samples))
-        except: return None
+    def set_history(self, samples=0):
+        """
+        Keeps (at least) the specified number of the most recently acquired
+        samples from each channel in self.history, a preallocated
+        _gui_tools.ring_buffer, so that you can look back across several
+        acquisitions. samples=0 turns this off.
+
+        Returns
+        -------
+        self
+        """
+        if samples: self.history = _gt.ring_buffer(2, samples)
+        else:       self.history = None
+        return self
+
+    def get_history(self):
+        """
+        Returns a (2, N) array of the last N samples kept by set_history(),
+        oldest first, or None if history is off.
+        """
+        if self.history is None: return None
+        return self.history.get()
+
+    def get_samples_async(self, samples=8192):
+        """
+        Runs get_samples(samples) in a background thread, returning a
+        concurrent.futures.Future whose result() is the same as get_samples().
+        This keeps the GUI alive during long (USB-limited) transfers. Avoid
+        talking to the device from elsewhere until it is done.
+        """
+        if self._pool == None: self._pool = _futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='m2k-io')
+        return self._pool.submit(self.get_samples, samples)
 
     def set_range_big(self, channel1=None, channel2=None):
         """
@@ -112,18 +362,20 @@ class _adalm2000_analog_in(_adalm2000_object):
         self
 
         """
-        if self.simulation_mode: return self
-
-        if channel1 is not None:
-            if channel1: self.more.setRange(_mp._libm2k.CHANNEL_1, _mp._libm2k.PLUS_MINUS_25V)
-            else:        self.more.setRange(_mp._libm2k.CHANNEL_1, _mp._libm2k.PLUS_MINUS_2_5V)
-
-        if channel2 is not None:
-            if channel2: self.more.setRange(_mp._libm2k.CHANNEL_2, _mp._libm2k.PLUS_MINUS_25V)
-            else:        self.more.setRange(_mp._libm2k.CHANNEL_2, _mp._libm2k.PLUS_MINUS_2_5V)
-
+        if channel1 is not None: self._set_range(0, channel1)
+        if channel2 is not None: self._set_range(1, channel2)
         return self
 
+    def _set_range(self, n, big):
+        """
+        Sets channel index n to the big (+/-25V, big=True) or small (+/-2.5V)
+        range, unless it is already there.
+        """
+        if self._ranges[n] == big: return
+        self.more.setRange(_mp._libm2k.CHANNEL_1 if n == 0 else _mp._libm2k.CHANNEL_2,
+                           _mp._libm2k.PLUS_MINUS_25V if big else _mp._libm2k.PLUS_MINUS_2_5V)
+        self._ranges[n] = big
+
     def set_range_small(self, channel1=None, channel2=None):
         """
         Set the channel ranges to "small" mode (+/-25V). Specifying None leaves
@@ -143,14 +395,8 @@ class _adalm2000_analog_in(_adalm2000_object):
         self
 
         """
-        if channel1 is not None:
-            if channel1: self.more.setRange(_mp._libm2k.CHANNEL_1, _mp._libm2k.PLUS_MINUS_2_5V)
-            else:        self.more.setRange(_mp._libm2k.CHANNEL_1, _mp._libm2k.PLUS_MINUS_25V)
-
-        if channel2 is not None:
-            if channel2: self.more.setRange(_mp._libm2k.CHANNEL_2, _mp._libm2k.PLUS_MINUS_2_5V)
-            else:        self.more.setRange(_mp._libm2k.CHANNEL_2, _mp._libm2k.PLUS_MINUS_25V)
-
+        if channel1 is not None: self._set_range(0, not channel1)
+        if channel2 is not None: self._set_range(1, not channel2)
         return self
 
     def set_trigger_modes(self, mode1, mode2):
@@ -180,9 +426,8 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode:
-            self.more.getTrigger().setAnalogMode(0,mode1)
-            self.more.getTrigger().setAnalogMode(1,mode2)
+        self._set_trigger('setAnalogMode', 0, mode1)
+        self._set_trigger('setAnalogMode', 1, mode2)
         return self
 
     def set_trigger_in(self, source):
@@ -207,7 +452,7 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode: self.more.getTrigger().setAnalogSource(source)
+        self._set_trigger('setAnalogSource', source)
         return self
 
     def set_trigger_out(self, source):
@@ -228,7 +473,7 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode: self.more.getTrigger().setAnalogExternalOutSelect(source)
+        self._set_trigger('setAnalogExternalOutSelect', source)
         return self
 
     def set_trigger_conditions(self, condition1, condition2):
@@ -252,12 +497,11 @@ class _adalm2000_analog_in(_adalm2000_object):
         self
 
         """
-        if not self.simulation_mode:
-            t = self.more.getTrigger()
-            t.setAnalogCondition        (0, condition1)
-            t.setAnalogExternalCondition(0, condition1)
-            t.setAnalogCondition        (1, condition2)
-            t.setAnalogExternalCondition(1, condition2) # BUG? This seems not to have any effect.
+        f = self._set_trigger
+        f('setAnalogCondition',         0, condition1)
+        f('setAnalogExternalCondition', 0, condition1)
+        f('setAnalogCondition',         1, condition2)
+        f('setAnalogExternalCondition', 1, condition2) # BUG? This seems not to have any effect.
 
         return self
 
@@ -265,10 +509,8 @@ class _adalm2000_analog_in(_adalm2000_object):
         """
         Returns the trigger levels (Volts) in a tuple.
         """
-        if self.simulation_mode: return 0,0
-        else:
-            t = self.more.getTrigger()
-            return t.getAnalogLevel(0), t.getAnalogLevel(1)
+        t = self._trigger
+        return t.getAnalogLevel(0), t.getAnalogLevel(1)
 
 
     def set_trigger_levels(self, V1, V2):
@@ -287,13 +529,39 @@ class _adalm2000_analog_in(_adalm2000_object):
         self
 
         """
-        if not self.simulation_mode:
-            t = self.more.getTrigger()
-            t.setAnalogLevel(0, V1)
-            t.setAnalogLevel(1, V2)
+        self._set_trigger('setAnalogLevel', 0, V1)
+        self._set_trigger('setAnalogLevel', 1, V2)
 
         return self
 
+    def set_and_get_trigger_levels(self, V1, V2):
+        """
+        Same as set_trigger_levels(V1, V2) followed by get_trigger_levels(),
+        but only reads back the level of a channel whose requested value
+        changed since the last call (e.g., while dragging the other one's
+        cursor), reusing the previous reading otherwise.
+
+        Parameters
+        ----------
+        V1 : float
+            Trigger voltage level for channel 1
+        V2 : float
+            Trigger voltage level for channel 2
+
+        Returns
+        -------
+        Tuple of the actual trigger levels (Volts).
+        """
+        Vs = []
+        for n, V in enumerate((V1, V2)):
+            self._set_trigger('setAnalogLevel', n, V)
+            x = self._trigger_levels.get(n)
+            if x == None or not x[0] == V:
+                x = self._trigger_levels[n] = (V, self._trigger.getAnalogLevel(n))
+            Vs.append(x[1])
+
+        return tuple(Vs)
+
     def set_trigger_hystereses(self, V1, V2):
         """
         Set the voltage hysteresis for the two channels.
@@ -309,21 +577,15 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode:
-            t = self.more.getTrigger()
-            t.setAnalogHysteresis(0, V1)
-            t.setAnalogHysteresis(1, V2)
+        self._set_trigger('setAnalogHysteresis', 0, V1)
+        self._set_trigger('setAnalogHysteresis', 1, V2)
         return self
 
     def get_trigger_delay(self):
         """
         Returns the trigger delay in seconds.
         """
-
-        if not self.simulation_mode:
-            t = self.more.getTrigger()
-            return t.getAnalogDelay() / self.get_sample_rate()
-        return 0
+        return self._trigger.getAnalogDelay() / self.get_sample_rate()
 
     def set_trigger_delay(self, delay=0.0):
         """
@@ -338,28 +600,84 @@ class _adalm2000_analog_in(_adalm2000_object):
         -------
         Actual trigger delay in seconds (self.get_trigger_delay()).
         """
-        if not self.simulation_mode:
-            t = self.more.getTrigger()
+        # Convert to samples and limit at -8192
+        N = int(delay*self.get_sample_rate())
+        if N < -8192: N = -8192
+
+        # Set it and check it (once per new value).
+        if self._trigger_delay == None or not self._trigger_sent.get(('setAnalogDelay',)) == N:
+            self._set_trigger('setAnalogDelay', N)
+            self._trigger_delay = self._trigger.getAnalogDelay()
+        return self._trigger_delay / self.get_sample_rate()
+
+    # Simulation-mode versions of the above (see _adalm2000_object)
+    def _get_sample_rate_simulation(self): return 1e7
+    def _set_sample_rate_simulation(self, sample_rate=100e6): return sample_rate
+
+    def _get_samples_simulation(self, samples=8192):
+        # One block of noise for both channels
+        v = self._rng.standard_normal((2, int(samples)))
+        if self.history is not None: self.history.extend(v[0], v[1])
+        return v[0], v[1]
+
+    def _get_samples_raw_simulation(self, samples=8192):
+        v = (100*self._rng.standard_normal((2, int(samples)))).astype(_n.int16)
+        return v[0], v[1]
+
+    def _set_enabled_simulation(self, enable1, enable2): return self
+    def _set_range_big_simulation(self, channel1=None, channel2=None): return self
+    def _set_range_small_simulation(self, channel1=None, channel2=None): return self
+    def _set_trigger_modes_simulation(self, mode1, mode2): return self
+    def _set_trigger_in_simulation(self, source): return self
+    def _set_trigger_out_simulation(self, source): return self
+    def _set_trigger_conditions_simulation(self, condition1, condition2): return self
+    def _get_trigger_levels_simulation(self): return 0,0
+    def _set_trigger_levels_simulation(self, V1, V2): return self
+    def _set_and_get_trigger_levels_simulation(self, V1, V2): return 0,0
+    def _set_trigger_hystereses_simulation(self, V1, V2): return self
+    def _get_trigger_delay_simulation(self): return 0
+    def _set_trigger_delay_simulation(self, delay=0.0): return delay
 
-            # Convert to samples and limit at -8192
-            N = int(delay*self.get_sample_rate())
-            if N < -8192: N = -8192
+class _adalm2000_analog_out(_adalm2000_object):
+    """
+    Analog output api.
 
-            # Set it and check it.
-            t.setAnalogDelay(N)
-            return self.get_trigger_delay()
-        return delay
+    Parameters
+    ----------
+    api
+        Instance of api returned by m2k.getAnalogOut(). If None, simulation mode.
+    """
+    _simulated = ['get_sample_rates', 'set_sample_rates', 'get_enabled', 'set_enabled',
+                  'enable', 'get_loop_modes', 'set_loop_modes', 'send_samples',
+                  'send_samples_dual', 'zero']
 
-class _adalm2000_analog_out(_adalm2000_object):
+    def __init__(self, api):
+        _adalm2000_object.__init__(self, api)
+
+        # Nothing sent yet
+        self._forget()
+
+    def _forget(self):
+        """
+        Forgets what we last sent to the hardware, so the next set_*() calls
+        send everything again (e.g., after an error).
+        """
+        # Enabled states we last sent (None = unknown)
+        self._enabled = [None, None]
+
+        # Sample rates and loop modes we last sent, with the device's replies
+        self._sample_rates_requested = None
+        self._sample_rates           = None
+        self._loop_modes_requested   = None
+        self._loop_modes             = None
 
     def get_sample_rates(self):
         """
         Returns the sample rates for each channel as tuple.
         """
-        if not self.simulation_mode: return self.more.getSampleRate(0), self.more.getSampleRate(1)
-        else: return 100.0, 100.0
+        return self.more.getSampleRate(0), self.more.getSampleRate(1)
 
-    def set_sample_rates(self, sample_rate1, sample_rate2):
+    def set_sample_rates(self, sample_rate1, sample_rate2, force=False):
         """
         Sets the analog out sample rate.
 
@@ -369,21 +687,26 @@ class _adalm2000_analog_out(_adalm2000_object):
             Rate (Hz) for analog out 1.
         sample_rate2 : float
             Rate (Hz) for analog out 2.
+        force=False : bool
+            If False, nothing is sent if these are the rates we last sent.
 
         Returns
         -------
         Actual sample rate
         """
-        if not self.simulation_mode:
+        # Only talk to the hardware if something changed
+        if force or not (sample_rate1, sample_rate2) == self._sample_rates_requested:
+            self._sample_rates_requested = None # Unknown until this works
             self.more.setSampleRate(0, sample_rate1)
             self.more.setSampleRate(1, sample_rate2)
-        return self.get_sample_rates()
+            self._sample_rates_requested = (sample_rate1, sample_rate2)
+            self._sample_rates           = self.get_sample_rates()
+        return self._sample_rates
 
     def get_enabled(self):
         """
         Returns the enabled state of each channel.
         """
-        if self.simulation_mode: return True, True
         return self.more.isChannelEnabled(0), self.more.isChannelEnabled(1)
 
     def set_enabled(self, enable1, enable2):
@@ -399,12 +722,14 @@ class _adalm2000_analog_out(_adalm2000_object):
 
         Returns
         -------
-        The enabled states (self.get_enabled())
+        The enabled states.
         """
-        if not self.simulation_mode:
-            self.more.enableChannel(0, enable1)
-            self.more.enableChannel(1, enable2)
-        return self.get_enabled()
+        # Only talk to the hardware about channels that change
+        for n, e in ((0, enable1), (1, enable2)):
+            if not self._enabled[n] == e:
+                self.more.enableChannel(n, e)
+                self._enabled[n] = e
+        return tuple(self._enabled)
 
     enable = set_enabled
 
@@ -412,12 +737,12 @@ class _adalm2000_analog_out(_adalm2000_object):
         """
         Returns the loop mode of both channels as tuple.
         """
-        if self.simulation_mode: return True, True
         return self.more.getCyclic(0), self.more.getCyclic(1)
 
-    def set_loop_modes(self, loop1, loop2):
+    def set_loop_modes(self, loop1, loop2, force=False):
         """
-        Sets the loop mode for each channel.
+        Sets the loop mode for each channel. This also zeros the outputs
+        (see zero()).
 
         Parameters
         ----------
@@ -425,22 +750,33 @@ class _adalm2000_analog_out(_adalm2000_object):
             Whether channel 1 is loop.
         loop2 : bool
             Whether channel 2 is loop.
+        force=False : bool
+            If False, and these are the modes we last sent, only zero the
+            outputs.
 
         Returns
         -------
         The loop state of each.
         """
-        if not self.simulation_mode:
-            # This is a hack that made it work reliably.
-            # Without messing with the buffer, it would only do
-            # one at a time.
+        # Modes already set; just reset the buffer as usual
+        if not force and (loop1, loop2) == self._loop_modes_requested:
+            self.zero()
+            return self._loop_modes
+
+        # This is a hack that made it work reliably.
+        # Without messing with the buffer, it would only do
+        # one at a time, and the whole thing needs doing twice to stick.
+        self._loop_modes_requested = None # Unknown until this works
+        for n in range(2):
             self.more.setCyclic(0, loop1)
             self.more.setCyclic(1, loop2)
             self.zero()
             self.more.setCyclic(0, loop1)
             self.more.setCyclic(1, loop2)
 
-        return self.get_loop_modes()
+        self._loop_modes_requested = (loop1, loop2)
+        self._loop_modes           = self.get_loop_modes()
+        return self._loop_modes
 
     def send_samples(self, channel, samples):
         """
@@ -457,11 +793,14 @@ class _adalm2000_analog_out(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode:
-            if not channel in [1,2]:
-                print('WARNING: send_samples() requires channel == 1 or 2')
-                channel = 1 # Some dummy proofing
-            self.more.push(channel-1, samples)
+        if not channel in [1,2]:
+            print('WARNING: send_samples() requires channel == 1 or 2')
+            channel = 1 # Some dummy proofing
+
+        # Contiguous float64 (no copy if it already is) so libm2k can use it
+        # directly. If this fails, the device state is anyone's guess.
+        try:    self.more.push(channel-1, _n.ascontiguousarray(samples, dtype=_n.float64))
+        except: self._forget(); raise
         return self
 
     def send_samples_dual(self, V1, V2):
@@ -480,52 +819,68 @@ class _adalm2000_analog_out(_adalm2000_object):
         -------
         self
         """
-        if not self.simulation_mode:
-            self.more.push([V1, V2])
+        try:
+            self.more.push([_n.ascontiguousarray(V1, dtype=_n.float64),
+                            _n.ascontiguousarray(V2, dtype=_n.float64)])
+        except: self._forget(); raise
         return self
 
     def zero(self):
         """
         Zero it. Stopping gives strange results. Disabling doesn't have an effect.
         """
-        if not self.simulation_mode:
-            self.set_enabled(True, True)
-            self.send_samples_dual(_n.zeros(4), _n.zeros(4))
+        self.set_enabled(True, True)
+        self.send_samples_dual(_zeros4, _zeros4)
+
+    # Simulation-mode versions of the above (see _adalm2000_object)
+    def _get_sample_rates_simulation(self): return 100.0, 100.0
+    def _set_sample_rates_simulation(self, sample_rate1, sample_rate2, force=False): return 100.0, 100.0
+    def _get_enabled_simulation(self): return True, True
+    def _set_enabled_simulation(self, enable1, enable2): return True, True
+    _enable_simulation = _set_enabled_simulation
+    def _get_loop_modes_simulation(self): return True, True
+    def _set_loop_modes_simulation(self, loop1, loop2, force=False): return True, True
+    def _send_samples_simulation(self, channel, samples): return self
+    def _send_samples_dual_simulation(self, V1, V2): return self
+    def _zero_simulation(self): return
 
 class _adalm2000_power(_adalm2000_object):
+    _simulated = ['get_Vp', 'get_Vm', 'set_Vp', 'set_Vm']
 
     def get_Vp(self):
         """
         Returns the current value of V+ on the power supply.
         """
-        if self.simulation_mode: return _n.random.rand()-0.5
         return self.more.readChannel(0)
 
     def get_Vm(self):
         """
         Returns the current value of V- on the power supply.
         """
-        if self.simulation_mode: return _n.random.rand()-0.5
-        else:                    return self.more.readChannel(1)
+        return self.more.readChannel(1)
 
     def set_Vp(self, Vp):
         """
         Sets V+.
         """
-        if not self.simulation_mode:
-            self.more.enableChannel(0, True)
-            self.more.pushChannel  (0, Vp)
+        self.more.enableChannel(0, True)
+        self.more.pushChannel  (0, Vp)
         return self
 
     def set_Vm(self, Vm):
         """
         Sets V-.
         """
-        if not self.simulation_mode:
-            self.more.enableChannel(1, True)
-            self.more.pushChannel  (1, Vm)
+        self.more.enableChannel(1, True)
+        self.more.pushChannel  (1, Vm)
         return self
 
+    # Simulation-mode versions of the above (see _adalm2000_object)
+    def _get_Vp_simulation(self): return _n.random.rand()-0.5
+    def _get_Vm_simulation(self): return _n.random.rand()-0.5
+    def _set_Vp_simulation(self, Vp): return self
+    def _set_Vm_simulation(self, Vm): return self
+
 class adalm2000_api():
     """
     Class for talking to an ADALM2000.
@@ -537,11 +892,17 @@ class adalm2000_api():
     """
     def __init__(self, name):
 
+        # Single worker thread for the blocking (USB) transfers
+        self._io_pool = _futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='m2k-io')
+
+        # Last timeout sent (ms)
+        self._timeout_ms = None
+
         # If the import failed, _mp._libm2k = None
         if _mp._libm2k == None:
             _s._warn('You need to install libm2k to access the adalm2000s.')
             self.simulation_mode = True
-            self.ai    = _adalm2000_analog_in(None)
+            self.ai    = _adalm2000_analog_in(None, self._io_pool)
             self.ao    = _adalm2000_analog_out(None)
             self.power = _adalm2000_power(None)
 
@@ -557,7 +918,7 @@ class adalm2000_api():
                 self.m2k = _mp._libm2k.contextOpen(name).toM2k()
 
                 # Get the ai, ao, and power.
-                self.ai    = _adalm2000_analog_in (self.m2k.getAnalogIn())
+                self.ai    = _adalm2000_analog_in (self.m2k.getAnalogIn(), self._io_pool)
                 self.ao    = _adalm2000_analog_out(self.m2k.getAnalogOut())
                 self.power = _adalm2000_power     (self.m2k.getPowerSupply())
 
@@ -570,7 +931,7 @@ class adalm2000_api():
 
             # If anything goes wrong, simulation mode
             else:
-                self.ai    = _adalm2000_analog_in(None)   # Simulated ai
+                self.ai    = _adalm2000_analog_in(None, self._io_pool) # Simulated ai
                 self.ao    = _adalm2000_analog_out(None)  # Simulated ao
                 self.power = _adalm2000_power(None) # Simulated power supply
                 self.simulation_mode = True
@@ -594,7 +955,9 @@ class adalm2000_api():
         -------
         self
         """
-        if not self.simulation_mode: self.m2k.setTimeout(timeout_ms)
+        if not self.simulation_mode and not timeout_ms == self._timeout_ms:
+            self.m2k.setTimeout(timeout_ms)
+            self._timeout_ms = timeout_ms
         return self
 
 class adalm2000():
@@ -621,6 +984,9 @@ class adalm2000():
         # Remember the name
         self.name = name
 
+        # Single worker thread for writing autosaved files
+        self._save_pool = _futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='adalm2000-save')
+
         # Build the graphical user interface
         self._build_gui(block)
 
@@ -676,6 +1042,7 @@ class adalm2000():
 
         # Connect remaining signals
         self.button_connect.signal_toggled.connect(self._button_connect_toggled)
+        self.tabs.signal_switched.connect(self._tabs_switched)
 
         # Disable the tabs until we connect
         self.tabs.disable()
@@ -709,10 +1076,20 @@ class adalm2000():
         self.tab_power.set_row_stretch(2)
 
         # Connect all the signals
-        self.tab_power.number_set_Vp     .signal_changed.connect(self._power_settings_changed)
-        self.tab_power.number_set_Vm     .signal_changed.connect(self._power_settings_changed)
-        self.tab_power.button_enable_Vp  .signal_toggled.connect(self._power_settings_changed)
-        self.tab_power.button_enable_Vm  .signal_toggled.connect(self._power_settings_changed)
+        self.tab_power.number_set_Vp     .signal_changed.connect(self._power_settings_changed_soon)
+        self.tab_power.number_set_Vm     .signal_changed.connect(self._power_settings_changed_soon)
+        self.tab_power.button_enable_Vp  .signal_toggled.connect(self._power_settings_changed_soon)
+        self.tab_power.button_enable_Vm  .signal_toggled.connect(self._power_settings_changed_soon)
+
+        # Timer that coalesces bursts of settings changes (e.g., scrolling a
+        # number) into one hardware update, once they stop for 50 ms
+        self.tab_power.timer_settings = _g.Timer(50, single_shot=True)
+        self.tab_power.timer_settings.signal_tick.connect(self._power_settings_changed)
+
+        # Fixed-size history of (t-t0, V+, V-) for the plot, which the plot's
+        # Clear button should also clear.
+        self.tab_power.history = _gt.ring_buffer(3, 8192)
+        self.tab_power.plot.after_clear = self.tab_power.history.clear
 
         # Timer for power update
         self.tab_power.timer = _g.Timer(500)
@@ -722,7 +1099,14 @@ class adalm2000():
         """
         Builds the innards of the analog in tab.
         """
-        self._ai_rates = [100e6, 100e5, 100e4, 100e3, 100e2, 100e1]
+        self._ai_rates = [_ai_rate_values[k] for k in _ai_rate_names]
+
+        # Cached time array and the (delay, rate, samples) that made it
+        self._ai_times     = None
+        self._ai_times_key = None
+
+        # Whether the raw plot is missing data it couldn't show while hidden
+        self._ai_plot_raw_stale = False
 
         # ADC Tab
         self.tab_ai = self.tabs.add_tab('Analog In')
@@ -739,6 +1123,7 @@ class adalm2000():
         self.tab_ai.tabs_data     = self.tab_ai.add(_g.TabArea(autosettings_path=self.name+'.tabs_data'), alignment=0)
 
         self.tab_ai.tab_raw  = self.tab_ai.tabs_data.add_tab('AI Raw Voltages')
+        self.tab_ai.tabs_data.signal_switched.connect(self._ai_tabs_data_switched)
         self.tab_ai.plot_raw = self.tab_ai.tab_raw.add(_g.DataboxPlot('*.ai', autosettings_path=self.name+'.tab_ai.plot_raw'), alignment=0)
         self.tab_ai.plot_raw.ROIs = [
             [_egg.pyqtgraph.InfiniteLine(angle=90, movable=True, pen=(0,2)),
@@ -779,7 +1164,7 @@ class adalm2000():
             name              = self.name+'.tab_ai.settings').set_width(230), column_span=4)
         s.add_parameter('Iterations', 0, tip='How many acquisitions to perform.')
         s.add_parameter('Samples', 1000.0, bounds=(2,None), siPrefix=True, suffix='S', dec=True, tip='How many samples to acquire. 1-8192 guaranteed. \nLarger values possible, depending on USB bandwidth.')
-        s.add_parameter('Rate', ['100 MHz', '10 MHz', '1 MHz', '100 kHz', '10 kHz', '1 kHz'], tip='How fast to sample voltages.')
+        s.add_parameter('Rate', _ai_rate_names, tip='How fast to sample voltages.')
         s.add_parameter('Timeout', 0.2, bounds=(0.1,None), suffix='s', siPrefix=True, dec=True, tip='How long to wait for a trigger before giving up. 0 means "forever"; be careful with that setting ;).')
         s.add_parameter('Timeout/Then_What', ['Immediate', 'Wait Again', 'Quit'], bounds=(0,None), suffix='s', siPrefix=True, dec=True, tip='How long to wait for a trigger before giving up. 0 means "forever"; be careful with that setting ;).')
 
@@ -791,58 +1176,18 @@ class adalm2000():
         s.add_parameter('Ch1_Range', ['25V', '2.5V'], tip='Range of accepted voltages.')
         s.add_parameter('Ch2_Range', ['25V', '2.5V'], tip='Range of accepted voltages.')
 
-        # Note these lists MUST be in this order; their indices are
-        # constants defined by libm2k: https://analogdevicesinc.github.io/libm2k/enums_8hpp.html
-
-        s.add_parameter('Trigger/In', [
-            'Ch1',
-            'Ch2',
-            'Ch1 or Ch2',
-            'Ch1 and Ch2',
-            'Ch1 xor Ch2',
-            'Digital In',
-            'Ch1 or Logic',
-            'Ch2 or Logic',
-            'Ch1 or Ch2 or Logic'
-            ], tip='Which source to use for triggering an acquisition.')
-
-        s.add_parameter('Trigger/Out', [
-            'None',
-            'Same Channel',
-            'Trigger In',
-            'Analog In',
-            'Digital In'
-            ], tip='Which trigger event to send to the trigger out (TO) port.')
+        # Note the order of these lists matters (see the top of this file).
+        s.add_parameter('Trigger/In',  _ai_trigger_ins,  tip='Which source to use for triggering an acquisition.')
+        s.add_parameter('Trigger/Out', _ai_trigger_outs, tip='Which trigger event to send to the trigger out (TO) port.')
 
         s.add_parameter('Trigger/Delay', 0.0, suffix='s', siPrefix=True, step=0.01,
                         tip='Horizontal (time) offset relative to trigger point. The trigger point is always defined to be at time t=0.')
 
-        s.add_parameter('Trigger/Ch1', [
-            'Immediate',
-            'Analog',
-            'External (TI)',
-            'Digital or Analog',
-            'Digital and Analog',
-            'Digital xor Analog',
-            'N Digital or Analog',
-            'N Digital and Analog',
-            'N Digital xor Analog'
-            ], tip='Trigger mode.')
-
-        s.add_parameter('Trigger/Ch2', [
-            'Immediate',
-            'Analog',
-            'External (TI)',
-            'Digital or Analog',
-            'Digital and Analog',
-            'Digital xor Analog',
-            'N Digital or Analog',
-            'N Digital and Analog',
-            'N Digital xor Analog'
-            ], tip='Trigger mode.')
-
-        s.add_parameter('Trigger/Ch1/Condition', ['Rising', 'Falling', 'Low Level', 'High Level'], tip='Type of trigger for this channel')
-        s.add_parameter('Trigger/Ch2/Condition', ['Rising', 'Falling', 'Low Level', 'High Level'], tip='Type of trigger for this channel')
+        s.add_parameter('Trigger/Ch1', _ai_trigger_modes, tip='Trigger mode.')
+        s.add_parameter('Trigger/Ch2', _ai_trigger_modes, tip='Trigger mode.')
+
+        s.add_parameter('Trigger/Ch1/Condition', _ai_trigger_conditions, tip='Type of trigger for this channel')
+        s.add_parameter('Trigger/Ch2/Condition', _ai_trigger_conditions, tip='Type of trigger for this channel')
 
         s.add_parameter('Trigger/Ch1/Level', 0.0, step=0.01, suffix='V', siPrefix=True, tip='Trigger level (Volts).')
         s.add_parameter('Trigger/Ch2/Level', 0.0, step=0.01, suffix='V', siPrefix=True, tip='Trigger level (Volts).')
@@ -860,9 +1205,14 @@ class adalm2000():
 
         # Connect all the signals.
         self.tab_ai.button_acquire.signal_toggled.connect(self._ai_button_acquire_toggled)
-        self.tab_ai.settings.connect_signal_changed('Trigger/Ch1/Level', self._ai_settings_changed)
-        self.tab_ai.settings.connect_signal_changed('Trigger/Ch2/Level', self._ai_settings_changed)
-        self.tab_ai.settings.connect_signal_changed('Trigger/Delay', self._ai_settings_changed)
+        self.tab_ai.settings.connect_signal_changed('Trigger/Ch1/Level', self._ai_settings_changed_soon)
+        self.tab_ai.settings.connect_signal_changed('Trigger/Ch2/Level', self._ai_settings_changed_soon)
+        self.tab_ai.settings.connect_signal_changed('Trigger/Delay',     self._ai_settings_changed_soon)
+
+        # Timer that coalesces bursts of settings changes into one update
+        # (see _ai_settings_changed_soon())
+        self.tab_ai.timer_settings = _g.Timer(50, single_shot=True)
+        self.tab_ai.timer_settings.signal_tick.connect(self._ai_settings_changed)
         self.tab_ai.button_auto.signal_clicked.connect(self._ai_button_auto_clicked)
 
         # Trigger cursors
@@ -883,6 +1233,10 @@ class adalm2000():
         """
         self._ao_rates = ao_rates
 
+        # Sorted rates and the index of each rate, for quickly choosing one
+        self._ao_rates_sorted = _n.sort(ao_rates)
+        self._ao_rate_indices = {r:n for n,r in enumerate(ao_rates)}
+
         # DAC Tab
         self.tab_ao =self.tabs.add_tab('Analog Out')
 
@@ -1026,12 +1380,21 @@ class adalm2000():
         pd.clear()
         pd.copy_headers_from(pr)
 
-        # Copy the columns in the right fashion (time-signal pairs)
+        # Copy the columns in the right fashion (time-signal pairs). The
+        # columns are inserted directly so that every channel shares the
+        # same time array rather than a fresh copy of it.
+        t = pr['t']
         for k in pr.ckeys[1:]:
-            pd['t_'+k] = pr['t']
-            pd[k]  = pr[k]
+            pd.ckeys += ['t_'+k, k]
+            pd.columns['t_'+k] = t
+            pd.columns[k]      = pr[k]
 
-        pd.plot().autosave()
+        # Plot, and autosave unless we're partway through a set of iterations
+        # (the AI tab's plot can autosave every one of those)
+        q = self.quadratures
+        pd.plot()
+        if not q.button_go() or q.number_iteration_sweep() >= q.settings['Input/Iterations']:
+            pd.autosave()
 
     def _quad_number_step_changed(self, *a):
         """
@@ -1067,7 +1430,7 @@ class adalm2000():
         self.waveform_designer.button_send.click()
 
         # Wait for the send to finish
-        while self.waveform_designer.button_send.is_checked(): self.window.sleep(0.01)
+        self.waveform_designer.button_send.sleep_until_unchecked(0.001)
 
         # Settle into steady state.
         self.window.sleep(q.settings['Input/Settle'])
@@ -1081,7 +1444,7 @@ class adalm2000():
 
             # Acquire
             self.tab_ai.button_acquire(True)
-            while self.tab_ai.button_acquire(): self.window.sleep()
+            self.tab_ai.button_acquire.sleep_until_unchecked(0.001)
             self.window.process_events()
 
         q.button_go(False).set_colors(None, None)
@@ -1106,11 +1469,16 @@ class adalm2000():
 
         # Do the loop
         S(0)
+        t_events = _t.time()
         while S() < sq['Sweep/Steps'] and q.button_sweep():
 
             # Increment the step and frequency
             S.increment() # Updates the frequency
-            self.window.process_events()
+
+            # Keep the GUI responsive (at most 20 times per second)
+            if _t.time() - t_events > 0.05:
+                self.window.process_events()
+                t_events = _t.time()
 
             # Go for this frequency!
             q.button_go.click()
@@ -1137,31 +1505,16 @@ class adalm2000():
         # Target period
         f_target = self.quadratures.number_frequency.get_value()
 
-        # If zero, it's simple
-        if not f_target: return f_target, 1, so[cs+'/Samples/Min'], ro, no
-
-        # Now, given this rate, calculate the number of points needed to make one cycle.
-        N1 = ro / f_target # This is a float with a remainder
-
-        # The goal now is to add an integer number of these cycles up to the
-        # Max_Buffer and look for the one with the smallest remainder.
-        max_cycles = int(        so[cs+'/Samples/Max']/N1 )
-        min_cycles = int(_n.ceil(so[cs+'/Samples/Min']/N1))
-
-        # List of options to search
-        options   = _n.array(range(min_cycles,max_cycles+1)) * N1 # Possible floats
+        # Buffer limits
+        samples_min = so[cs+'/Samples/Min']
+        samples_max = so[cs+'/Samples/Max']
 
-        # How close each option is to an integer.
-        residuals = _n.minimum(abs(options-_n.ceil(options)), abs(options-_n.floor(options)))
-
-        # Now we can get the number of cycles
-        c = _n.where(residuals==min(residuals))[0][0]
-
-        # Now we can get the number of samples
-        N = int(_n.round(N1*(c+min_cycles)))
+        # If zero, it's simple
+        if not f_target: return f_target, 1, samples_min, ro, no
 
-        # If this is below the minimum value, set it to the minimum
-        if N < so[cs+'/Samples/Min']: N = so[cs+'/Samples/Min']
+        # Now, given this rate, calculate the number of points needed to make
+        # one cycle (a float with a remainder), and the best buffer size.
+        N = _get_cycles_samples(ro / f_target, samples_min, samples_max)
 
         # Update the GUI
         #self.tab_quadratures.label_samples.set_text('AO Buffer: '+str(N))
@@ -1169,7 +1522,7 @@ class adalm2000():
         # Now, given this number of points, which might include several oscillations,
         # calculate the actual closest frequency
         df = ro/N # Frequency step
-        n  = int(_n.round(self.quadratures.number_frequency()/df)) # Number of cycles
+        n  = int(round(f_target/df)) # Number of cycles
         f  = n*df # Actual frequency that fits.
 
         return f, n, N, ro, no
@@ -1187,24 +1540,30 @@ class adalm2000():
         q = self.quadratures
         sq = q.settings
 
+        # Values used more than once
+        f_target    = q.number_frequency()
+        max_samples = sq['Input/Max_Samples']
+
         ### Set up the AO. We "intelligently" choose the output rate to get
         # Disable auto waveform update.
         self.waveform_designer.checkbox_auto.set_checked(False)
 
         # close to the desired frequency
-        rate_index = self._quad_get_best_ao_rate_index('Ch1', q.number_frequency())
+        rate_index = self._quad_get_best_ao_rate_index('Ch1', f_target)
 
-        # Set up the output channels
+        # Set up the output channels' waveforms in one go
         d = dict()
         for c in ['Ch1','Ch2']:
             d[c+'/Waveform']       = 'Sine'
             d[c+'/Sine/Amplitude'] = sq['Output/'+c+'_Amplitude']
             d[c+'/Sine/Offset']    = 0
             d[c+'/Sine/Phase']     = 90
+        so.update(d, block_key_signals=True)
 
-            so.update(d, block_key_signals=True)
+        # Set up the output channels' rates and frequencies
+        for c in ['Ch1','Ch2']:
             so.set_list_index(c+'/Rate', rate_index, block_key_signals=True)
-            so.set_value(c+'/Sine', self.quadratures.number_frequency(), block_key_signals=True)
+            so.set_value(c+'/Sine', f_target, block_key_signals=True)
 
             # Update the actual frequency etc
             self.waveform_designer.update_other_quantities_based_on(c+'/Sine')
@@ -1221,21 +1580,21 @@ class adalm2000():
         # Calculate how many samples to record after the delay
         # If f is nonzero, we need an integer number of cycles * time per cycle * the rate
         if f:
-            samples = _n.ceil(sq['Input/Collect']*f) / f * ri
+            samples = _math.ceil(sq['Input/Collect']*f) / f * ri
 
             # If we have too many samples, calculate the max possible within bounds
-            if samples > sq['Input/Max_Samples']:
-                samples = _n.round(_n.floor(sq['Input/Max_Samples']*f)/f)
+            if samples > max_samples:
+                samples = round(_math.floor(max_samples*f)/f)
 
                 # If we got a zero back, we can't even fit one period in the
                 # input buffer. We should never get here, but raise a flag!
                 if samples <= 0:
                     print('ERROR: Max input buffer cannot hold even a single period!')
                     self.window.set_colors(None, 'pink')
-                    samples = sq['Input/Max_Samples']
+                    samples = max_samples
 
         # Otherwise, we just use the time.
-        else: samples = min(sq['Input/Max_Samples'], _n.round(sq['Sweep/Collect'] * ri))
+        else: samples = min(max_samples, round(sq['Sweep/Collect'] * ri))
 
         # Finally.
         si['Samples'] = samples
@@ -1250,10 +1609,7 @@ class adalm2000():
         si['Trigger/Delay'] = 0 # We manually delay.
 
         # Also update the demod frequency
-        self.quadratures.number_frequency(f, block_signals=True)
-
-        # Make sure everything updates!
-        self.window.process_events()
+        q.number_frequency(f, block_signals=True)
 
     def _quad_get_best_ao_rate_index(self, channel, f_target, min_samples_per_period=20):
         """
@@ -1273,13 +1629,12 @@ class adalm2000():
             if f_target: rate_min = min_samples_per_period*f_target
             else:        rate_min = sq['Input/Max_Samples']/sq['Sweep/Collect']
 
-            # Now find the first rate higher than this
-            for n in range(len(self._ao_rates)):
-                r = self._ao_rates[-n-1]
-                if r > rate_min: break
+            # Now find the lowest rate higher than this (or the highest rate)
+            n = _n.searchsorted(self._ao_rates_sorted, rate_min, side='right')
+            r = self._ao_rates_sorted[min(n, len(self._ao_rates_sorted)-1)]
 
             # Now get the actual frequency associated with this number of steps
-            return self._ao_rates.index(r)
+            return self._ao_rate_indices[r]
 
         # Rate is specified by the user
         else: return sq.get_list_index('Output/Rate')
@@ -1306,8 +1661,7 @@ class adalm2000():
         # Set the rates
         self.ao.set_sample_rates(self._ao_get_rate('Ch1'), self._ao_get_rate('Ch2'))
 
-        # Set Loop mode (BUG: NEED TO DO THIS TWICE FOR IT TO STICK)
-        self.ao.set_loop_modes(s['Ch1/Loop'], s['Ch2/Loop'])
+        # Set Loop mode
         self.ao.set_loop_modes(s['Ch1/Loop'], s['Ch2/Loop'])
 
         # Dual sync'd mode
@@ -1322,7 +1676,7 @@ class adalm2000():
         ps = self.waveform_designer.plot_sent
         ps.clear()
         ps.copy_all(p)
-        ps.plot(); self.window.process_events()
+        ps.plot()
 
         self.waveform_designer.button_send.set_checked(False)
         self.window.process_events()
@@ -1531,25 +1885,67 @@ class adalm2000():
         if self.tab_power.button_monitor_Vp.is_checked(): Vp = self.api.power.get_Vp()
         if self.tab_power.button_monitor_Vm.is_checked(): Vm = self.api.power.get_Vm()
 
-        data_point = [_t.time()-self.t0]
-
-        # Update the labels and plot
+        # Update the labels
         if Vp == None:
             self.tab_power.label_Vp.set_text('(not measured)').set_colors('pink' if _s.settings['dark_theme_qt'] else 'red')
+            Vp = _n.nan
         else:
             self.tab_power.label_Vp.set_text('%.3f V' % Vp).set_colors(None)
-            data_point.append(Vp)
 
         if Vm == None:
             self.tab_power.label_Vm.set_text('(not measured)').set_colors('pink' if _s.settings['dark_theme_qt'] else 'red')
+            Vm = _n.nan
         else:
             self.tab_power.label_Vm.set_text('%.3f V' % Vm).set_colors(None)
-            data_point.append(Vm)
 
-        # Add it to the history
-        self.tab_power.plot.append_row(data_point, ['t-t0', 'V+', 'V-'])
-        self.tab_power.plot.plot()
+        # Add it to the (fixed-size) history, and only redraw if someone can see it
+        self.tab_power.history.append(_t.time()-self.t0, Vp, Vm)
+        if _gt.is_tab_showing(self.tabs, self.tab_power): self._power_update_plot()
+
+    def _power_update_plot(self):
+        """
+        Sends the power history to the plot.
+        """
+        p = self.tab_power.plot
+        p['t-t0'], p['V+'], p['V-'] = self.tab_power.history.get()
+        p.plot()
+
+    def _tabs_switched(self, *a):
+        """
+        Someone switched a tab! Catch the power and AI raw plots up on what
+        they missed.
+        """
+        if _gt.is_tab_showing(self.tabs, self.tab_power): self._power_update_plot()
+        if self._ai_plot_raw_stale: self._ai_update_plot_raw()
+
+    def _ai_update_plot_raw(self):
+        """
+        Plots the AI raw data (drawing only what the pixels can show) if it
+        is showing, or remembers to do so when it is.
+        """
+        if _gt.is_tab_showing(self.tabs, self.tab_ai) \
+        and _gt.is_tab_showing(self.tab_ai.tabs_data, self.tab_ai.tab_raw):
+            p = self.tab_ai.plot_raw
+            p.plot()
+            _gt.set_peak_downsampling(p)
+            self._ai_plot_raw_stale = False
+        else:
+            self._ai_plot_raw_stale = True
 
+    def _ai_tabs_data_switched(self, *a):
+        """
+        Someone switched an AI data tab! Catch the raw plot up if needed.
+        """
+        if self._ai_plot_raw_stale: self._ai_update_plot_raw()
+
+
+    def _power_settings_changed_soon(self, *a):
+        """
+        Called whenever someone changes a setting in the power tab. Restarts
+        the timer that calls _power_settings_changed(), so the hardware is
+        only updated once the changes stop.
+        """
+        self.tab_power.timer_settings.start()
 
     def _power_settings_changed(self, *a):
         """
@@ -1592,14 +1988,41 @@ class adalm2000():
         """
         return self._ai_rates[self.tab_ai.settings.get_list_index('Rate')]
 
+    def _ai_get_times(self, t_delay, rate, samples):
+        """
+        Returns the time array for the supplied trigger delay (s), rate (Hz),
+        and number of samples, reusing the previous array when these have
+        not changed (the usual case when looping).
+        """
+        key = (t_delay, rate, samples)
+        if not self._ai_times_key == key:
+            self._ai_times     = t_delay + _n.arange(samples) * (1.0/rate)
+            self._ai_times_key = key
+        return self._ai_times
+
+    def _ai_settings_changed_soon(self, *a):
+        """
+        Called when specific settings change. Restarts the timer that calls
+        _ai_settings_changed(), so the cursors and hardware are only updated
+        once the changes stop (e.g., at the end of a drag).
+        """
+        self.tab_ai.timer_settings.start()
+
     def _ai_settings_changed(self, *a):
         """
-        Called when specific settings change.
+        Transfers the trigger settings to the cursors (and hardware).
         """
-        self.tab_ai.plot_raw.ROIs[0][0].setPos((self.tab_ai.settings['Trigger/Delay'], 0))
-        self.tab_ai.plot_raw.ROIs[1][0].setPos((self.tab_ai.settings['Trigger/Delay'], 0))
-        self.tab_ai.plot_raw.ROIs[0][1].setPos((0, self.tab_ai.settings['Trigger/Ch1/Level']))
-        self.tab_ai.plot_raw.ROIs[1][1].setPos((0, self.tab_ai.settings['Trigger/Ch2/Level']))
+        s = self.tab_ai.settings
+        R = self.tab_ai.plot_raw.ROIs
+
+        # Move the cursors without each one calling _ai_cursor_drag() (and
+        # possibly the hardware); we do that once below.
+        for r in (R[0][0], R[1][0], R[0][1], R[1][1]): r.blockSignals(True)
+        R[0][0].setPos((s['Trigger/Delay'], 0))
+        R[1][0].setPos((s['Trigger/Delay'], 0))
+        R[0][1].setPos((0, s['Trigger/Ch1/Level']))
+        R[1][1].setPos((0, s['Trigger/Ch2/Level']))
+        for r in (R[0][0], R[1][0], R[0][1], R[1][1]): r.blockSignals(False)
 
         if(self.button_connect.is_checked()): self._ai_cursor_drag()
 
@@ -1607,36 +2030,45 @@ class adalm2000():
         """
         Called whenever someone moves a cursor in the analog in tab.
         """
-        # Time cursors should set each other.
-        if len(a) and a[0] == self.tab_ai.plot_raw.ROIs[0][0]:
+        R = self.tab_ai.plot_raw.ROIs
+
+        # Time cursors should set each other. The other cursor is moved
+        # with its signals blocked so it doesn't bounce back here.
+        if len(a) and a[0] == R[0][0]:
 
             # Get the x-position and update the other stuff
             x = a[0].getPos()[0]
-            self.tab_ai.plot_raw.ROIs[1][0].setPos((x,0))
+            R[1][0].blockSignals(True)
+            R[1][0].setPos((x,0))
+            R[1][0].blockSignals(False)
             self.tab_ai.settings['Trigger/Delay'] = x
 
-        elif len(a) and a[0] == self.tab_ai.plot_raw.ROIs[1][0]:
+        elif len(a) and a[0] == R[1][0]:
 
             # Get the x-position and update the other stuff
             x = a[0].getPos()[0]
-            self.tab_ai.plot_raw.ROIs[0][0].setPos((x,0))
+            R[0][0].blockSignals(True)
+            R[0][0].setPos((x,0))
+            R[0][0].blockSignals(False)
             self.tab_ai.settings['Trigger/Delay'] = x
 
         # Other cursors are simpler.
         else:
 
             # Trigger level cursors
-            V1 = self.tab_ai.plot_raw.ROIs[0][1].getPos()[1]
-            V2 = self.tab_ai.plot_raw.ROIs[1][1].getPos()[1]
+            V1 = R[0][1].getPos()[1]
+            V2 = R[1][1].getPos()[1]
 
             # Set them on the hardware if we are not in simulation mode
             if not self.api.simulation_mode:
-                self.ai.set_trigger_levels(V1, V2)
-                V1, V2 = self.ai.get_trigger_levels()
+                V1, V2 = self.ai.set_and_get_trigger_levels(V1, V2)
 
-            # Update the cursor to the actual value
-            self.tab_ai.plot_raw.ROIs[0][1].setPos((0,V1))
-            self.tab_ai.plot_raw.ROIs[1][1].setPos((0,V2))
+            # Update the cursor to the actual value, without calling this
+            # function (and the hardware) again for each of them.
+            R[0][1].blockSignals(True); R[1][1].blockSignals(True)
+            R[0][1].setPos((0,V1))
+            R[1][1].setPos((0,V2))
+            R[0][1].blockSignals(False); R[1][1].blockSignals(False)
 
             # Trigger levels
             self.tab_ai.settings.set_value('Trigger/Ch1/Level', V1, block_all_signals=True)
@@ -1650,10 +2082,11 @@ class adalm2000():
         s = self.tab_ai.settings
 
         # If there is data, use the midpoints for the level
-        if len(p.ckeys) > 1: s['Trigger/Ch1/Level'] = 0.5*(max(p[1])+min(p[1]))
-        else:                s['Trigger/Ch1/Level'] = 0.0;
-        if len(p.ckeys) > 2: s['Trigger/Ch2/Level'] = 0.5*(max(p[2])+min(p[2]))
-        else:                s['Trigger/Ch2/Level'] = 0.0;
+        N = len(p.ckeys)
+        if N > 1: c = p[1]; s['Trigger/Ch1/Level'] = 0.5*(c.max()+c.min())
+        else:               s['Trigger/Ch1/Level'] = 0.0;
+        if N > 2: c = p[2]; s['Trigger/Ch2/Level'] = 0.5*(c.max()+c.min())
+        else:               s['Trigger/Ch2/Level'] = 0.0;
 
         # Set the delay to zero
         s['Trigger/Delay'] = 0
@@ -1687,58 +2120,72 @@ class adalm2000():
                 s['Trigger/In'] = 'Ch1'
                 s['Trigger/Ch1'] = 'External (TI)'
 
+            # Snapshot the settings (one walk through the tree instead of one per key)
+            c = s.get_dictionary(short_keys=True)[1]
+
             # Set the timeout
-            self.api.set_timeout(int(s['Timeout']*1000));
+            self.api.set_timeout(int(c['Timeout']*1000));
 
             # Set the sampling rate (variable 'rate' used below)
-            rate = self._ai_rates[s.get_list_index('Rate')]
+            rate = _ai_rate_values[c['Rate']]
             self.ai.set_sample_rate(rate)
 
             # Set the ranges
-            self.ai.set_range_big(s['Ch1_Range']=='25V', s['Ch2_Range']=='25V')
+            self.ai.set_range_big(c['Ch1_Range']=='25V', c['Ch2_Range']=='25V')
 
             # Set the trigger source, out, conditions, and levels
-            self.ai.set_trigger_in  (s.get_list_index('Trigger/In'))
-            self.ai.set_trigger_out (s.get_list_index('Trigger/Out'))
-            t_delay = self.ai.set_trigger_delay(s['Trigger/Delay'])
-
-            self.ai.set_trigger_modes(s.get_list_index('Trigger/Ch1'),
-                                      s.get_list_index('Trigger/Ch2'))
-            self.ai.set_trigger_conditions(s.get_list_index('Trigger/Ch1/Condition'),
-                                           s.get_list_index('Trigger/Ch2/Condition'))
-            self.ai.set_trigger_levels(s['Trigger/Ch1/Level'],
-                                       s['Trigger/Ch2/Level'])
-            self.ai.set_trigger_hystereses(s['Trigger/Ch1/Hysteresis'],
-                                           s['Trigger/Ch2/Hysteresis'])
+            self.ai.set_trigger_in  (_ai_trigger_in_index [c['Trigger/In']])
+            self.ai.set_trigger_out (_ai_trigger_out_index[c['Trigger/Out']])
+            t_delay = self.ai.set_trigger_delay(c['Trigger/Delay'])
+
+            self.ai.set_trigger_modes(_ai_trigger_mode_index[c['Trigger/Ch1']],
+                                      _ai_trigger_mode_index[c['Trigger/Ch2']])
+            self.ai.set_trigger_conditions(_ai_trigger_condition_index[c['Trigger/Ch1/Condition']],
+                                           _ai_trigger_condition_index[c['Trigger/Ch2/Condition']])
+            self.ai.set_trigger_levels(c['Trigger/Ch1/Level'],
+                                       c['Trigger/Ch2/Level'])
+            self.ai.set_trigger_hystereses(c['Trigger/Ch1/Hysteresis'],
+                                           c['Trigger/Ch2/Hysteresis'])
 
             # Get the time array
-            ts = _n.linspace(t_delay, t_delay + (int(s['Samples'])-1)/rate, int(s['Samples']))
+            N  = int(c['Samples'])
+            ts = self._ai_get_times(t_delay, rate, N)
 
             # Get the data
             self.tab_ai.button_onair(True).set_colors('red', 'pink');
-            self.window.process_events();
 
-            vs = self.ai.get_samples(int(s['Samples']))
+            # Transfer in the background, keeping the window alive (the
+            # sleeps process the window's events, including the one above)
+            future = self.ai.get_samples_async(N)
+            while not future.done(): self.window.sleep(0.001)
+            vs = future.result()
 
             self.tab_ai.button_onair(False).set_colors(None, None);
-            self.window.process_events();
 
             # If vs==None it's a timeout
             if vs:
-                # Clear and send the current settings to plotter
-                p.clear()
+                # Send the current settings to plotter, clearing the columns
+                # only if they're not already the ones we're about to fill
+                if p.ckeys == ['t', 'V1', 'V2']: p.clear_headers()
+                else:                            p.clear()
                 s.send_to_databox_header(p)
                 self.waveform_designer.settings.send_to_databox_header(p)
                 self.quadratures.settings.send_to_databox_header(p)
                 p.h(t=_t.time()-self.t0, t0=self.t0)
 
-                # Add columns
+                # Add columns. get_samples() always returns two channels,
+                # the rows of a new (2, samples) array. Rows are already
+                # contiguous, so ascontiguousarray() doesn't copy them, and
+                # they are installed directly rather than copied by
+                # p['V1'] = ... The time array is cached, so it is copied.
                 p['t'] = ts
-                for i in range(len(vs)): p['V'+str(i+1)] = vs[i]
+                p.columns['V1'] = _n.ascontiguousarray(vs[0])
+                p.columns['V2'] = _n.ascontiguousarray(vs[1])
+                p.ckeys = ['t', 'V1', 'V2']
 
-                # Update the plot and autosave if that's enabled
-                p.plot()
-                p.autosave()
+                # Update the plot and autosave (in the background) if that's enabled
+                self._ai_update_plot_raw()
+                _gt.autosave_in_background(p, self._save_pool)
 
                 # External analysis
                 self.process_data()
@@ -1747,29 +2194,25 @@ class adalm2000():
                 q = self.quadratures
                 if q.checkbox_auto():
 
-                    # Import the data
+                    # Import the data and get the quadratures
                     q.button_get_raw.click()
-                    self.window.process_events()
-
-                    # Get the quadratures
                     q.button_get_quadratures.click()
-                    self.window.process_events()
 
                 # Increment, update move on.
                 n += 1
                 self.tab_ai.label_info.set_text('Iteration: '+str(n))
 
             # Timeout
-            elif self.tab_ai.settings['Timeout/Then_What'] == 'Quit': break
-            elif self.tab_ai.settings['Timeout/Then_What'] == 'Immediate':
+            elif c['Timeout/Then_What'] == 'Quit': break
+            elif c['Timeout/Then_What'] == 'Immediate':
 
                 # If we're already in immediate mode, something more serious is at play.
-                if  self.tab_ai.settings['Trigger/Ch1'] == 'Immediate' \
-                and self.tab_ai.settings['Trigger/Ch2'] == 'Immediate': break
+                if  c['Trigger/Ch1'] == 'Immediate' \
+                and c['Trigger/Ch2'] == 'Immediate': break
 
                 # Set to immediate mode to get *some* data
-                self.tab_ai.settings['Trigger/Ch1'] = 'Immediate'
-                self.tab_ai.settings['Trigger/Ch2'] = 'Immediate'
+                s['Trigger/Ch1'] = 'Immediate'
+                s['Trigger/Ch2'] = 'Immediate'
 
                 # Warn the demodders know it's not triggered.
                 if self.quadratures.button_get_raw.is_checked():
@@ -1795,13 +2238,12 @@ class adalm2000():
         """
         Do the analysis after each acquisition.
         """
-        # Massage the data
-        self.tab_ai.A1.run().plot.autosave()
-        self.tab_ai.A2.run().plot.autosave()
-        self.tab_ai.A3.run().plot.autosave()
-        self.tab_ai.B1.run().plot.autosave()
-        self.tab_ai.B2.run().plot.autosave()
-        self.tab_ai.B3.run().plot.autosave()
+        # Massage the data, autosaving (if enabled) in the background so the
+        # next analyzer doesn't wait for the disk. A copy of each plot is
+        # written, so the processors are free to modify their columns.
+        for a in (self.tab_ai.A1, self.tab_ai.A2, self.tab_ai.A3,
+                  self.tab_ai.B1, self.tab_ai.B2, self.tab_ai.B3):
+            _gt.autosave_in_background(a.run().plot, self._save_pool)
 
         # Additional analysis that is not of general use.
         self.process_data2()
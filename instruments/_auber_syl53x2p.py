@@ -37,11 +37,23 @@ class auber_syl53x2p_api():
         
     temperature_limit=450 : float
         Upper limit on the temperature setpoint (C).
+
+    probe_timeout=500 : number
+        How long to wait for the reply to the first (test) query (ms), so that
+        a missing instrument is detected quickly. Must be >300 for this instrument.
+
+    clear_buffers=False : bool
+        Whether to flush the serial buffers before every transaction. They
+        are always flushed once when connecting; set this to True if the
+        connection is noisy enough to leave stray bytes between transactions.
     """
-    def __init__(self, port='COM3', address=1, baudrate=9600, timeout=2000, temperature_limit=500):
+    def __init__(self, port='COM3', address=1, baudrate=9600, timeout=2000, temperature_limit=500, probe_timeout=500, clear_buffers=False):
 
         self._temperature_limit = temperature_limit        
 
+        # Noise generator for simulation mode
+        self._rng = _n.random.default_rng()
+
         # Check for installed libraries
         if not _mp._minimalmodbus or not _mp._serial:
             _s._warn('You need to install pyserial and minimalmodbus to use the Auber SYL-53X2P.')
@@ -65,21 +77,22 @@ class auber_syl53x2p_api():
                 self.modbus.serial.bytesize = 8                     # Typical size of a byte :)
                 self.modbus.serial.parity = _mp._minimalmodbus.serial.PARITY_NONE # No parity check for this instrument.
                 self.modbus.serial.stopbits = 1                     # Whatever this means. It needs to be 1 for this instrument.
-                self.modbus.serial.timeout  = timeout*0.001         # Timeout in seconds. Must be >0.3 for this instrument.
+                self.modbus.serial.timeout  = probe_timeout*0.001   # Timeout in seconds for the test below. Must be >0.3 for this instrument.
                 self.modbus.mode = _mp._minimalmodbus.MODE_RTU                    # RTU or ASCII mode. Must be RTU for this instrument.
-                self.modbus.clear_buffers_before_each_transaction = True # Seems like a good idea. Works, too.
+                self.modbus.clear_buffers_before_each_transaction = clear_buffers
+                self.modbus.serial.reset_input_buffer()             # Start clean either way.
 
                 # Simulation mode flag
                 self.simulation_mode = False
 
-                # Test the connection
+                # Test the connection, then use the normal timeout
                 self.get_temperature()
+                self.modbus.serial.timeout = timeout*0.001
 
 
             # Something went wrong. Go into simulation mode.
             except Exception as e:
-                print('Could not open connection to "'+port+':'+str(address)+'" at baudrate '+str(baudrate)+'. Entering simulation mode.')
-                print(e)
+                _s._warn('Could not open connection to "'+port+':'+str(address)+'" at baudrate '+str(baudrate)+' ('+str(e)+'). Entering simulation mode.')
                 self.modbus = None
                 self.simulation_mode = True
 
@@ -107,14 +120,14 @@ class auber_syl53x2p_api():
         """
         Gets the current output power (percent).
         """
-        if self.simulation_mode: return _n.random.randint(0,200)
+        if self.simulation_mode: return int(self._rng.integers(0,200))
         else:                    return self.modbus.read_register(0x1101, 0)
 
     def get_temperature(self):
         """
         Gets the current temperature in Celcius.
         """
-        if self.simulation_mode: return _n.round(_n.random.rand()+24, 1)
+        if self.simulation_mode: return round(self._rng.random()+24, 1)
         else:                    return self.modbus.read_register(0x1001, 1)
 
     def get_temperature_setpoint(self):
@@ -124,6 +137,18 @@ class auber_syl53x2p_api():
         if self.simulation_mode: return 24.5
         else:                    return self.modbus.read_register(0x1002, 1)
 
+    def get_all(self):
+        """
+        Gets the current temperature (C), temperature setpoint (C), and main
+        output power (percent), reading the (adjacent) temperature and setpoint
+        registers in a single transaction.
+        """
+        if self.simulation_mode:
+            return self.get_temperature(), self.get_temperature_setpoint(), self.get_main_output_power()
+
+        T, S = self.modbus.read_registers(0x1001, 2)
+        return T/10.0, S/10.0, self.get_main_output_power()
+
     def set_temperature_setpoint(self, T=20.0, temperature_limit=None):
         """
         Sets the temperature setpoint to the supplied value in Celcius.
@@ -214,9 +239,17 @@ class auber_syl53x2p(_serial_tools.serial_gui_base):
             autosettings_path=name+'.plot',
             delimiter=',', show_logger=True), alignment=0, column_span=10)
 
-        # Timer for collecting data
+        # Unless the user chose a plot history (History box, autosaved), keep
+        # 86400 readings (a day at one per second). Older readings are dropped
+        # from the plot, but not from the log file.
+        if not self.plot.number_history(): self.plot.number_history.set_value(86400)
+
+        # Timer for collecting data. It ticks every second, or every 5 seconds
+        # once the temperature has been steady at the setpoint for 10 ticks.
         self.timer = _g.Timer(interval_ms=1000, single_shot=False)
         self.timer.signal_tick.connect(self._timer_tick)
+        self._T_last       = None
+        self._steady_ticks = 0
 
         # Bottom log file controls
         self.grid_bot.new_autorow()
@@ -231,6 +264,16 @@ class auber_syl53x2p(_serial_tools.serial_gui_base):
         # Set the temperature setpoint
         self.api.set_temperature_setpoint(self.number_setpoint.get_value(), self._temperature_limit)
 
+        # Watch closely while it gets there
+        self._tick_quickly()
+
+    def _tick_quickly(self):
+        """
+        Returns the timer to its fast (1 second) interval.
+        """
+        if self._steady_ticks >= 10: self.timer.set_interval(1000)
+        self._steady_ticks = 0
+
 
 
 
@@ -240,18 +283,23 @@ class auber_syl53x2p(_serial_tools.serial_gui_base):
         """
         # Get the time, temperature, and setpoint
         t = _time.time()-self.t0
-        T = self.api.get_temperature()
-        S = self.api.get_temperature_setpoint()
-        P = self.api.get_main_output_power()
+        T, S, P = self.api.get_all()
         self.number_setpoint.set_value(S, block_signals=True)
 
+        # Poll less often when the temperature is steady at the setpoint
+        if self._T_last is not None and abs(T-S) < 0.2 and abs(T-self._T_last) < 0.05:
+            self._steady_ticks += 1
+            if self._steady_ticks == 10: self.timer.set_interval(5000)
+        else: self._tick_quickly()
+        self._T_last = T
+
         # Append this to the databox
         self.plot.append_row([t, T, S, P], ckeys=['Time (s)', 'Temperature (C)', 'Setpoint (C)', 'Power (%)'])
         self.plot.plot()
 
         # Update the big red text.
         self.number_temperature(T)
-        self.label_temperature_status.set_text('')
+        if self.label_temperature_status.get_text(): self.label_temperature_status.set_text('')
         self.window.process_events()
 
 
@@ -265,6 +313,8 @@ class auber_syl53x2p(_serial_tools.serial_gui_base):
             # Get the setpoint
             try:
                 self.number_setpoint.set_value(self.api.get_temperature_setpoint(), block_signals=True)
+                self._T_last = None
+                self._tick_quickly()
                 self.timer.start()
             except:
                 self.number_setpoint.set_value(0)
@@ -1,7 +1,10 @@
 import spinmob.egg as _egg
 import spinmob     as _s
 import numpy       as _n
+import math        as _math
 import os          as _os
+import functools   as _functools
+import threading   as _threading
 
 # Shortcuts
 _g = _egg.gui
@@ -10,6 +13,7 @@ _x = None
 
 
 
+@_functools.lru_cache(maxsize=1024)
 def get_nearest_frequency_settings(f_target=12345.678, rate=10e6, min_samples=200, max_samples=8096, buffer_increment=1):
     """
     Finds the closest frequency (Hz) that is possible for the specified rate (Hz)
@@ -33,6 +37,10 @@ def get_nearest_frequency_settings(f_target=12345.678, rate=10e6, min_samples=20
         Enforce that the output buffer size is an integer multiple of this.
         For the adalm2000, e.g., this must be 4 as of v0.2.1 libm2k
 
+    The results for the most recent 1024 sets of arguments are remembered,
+    since the GUI often asks for the same ones again. The arguments must
+    therefore be hashable (e.g., numbers, not arrays).
+
     Returns
     -------
     nearest achievable frequency
@@ -52,17 +60,19 @@ def get_nearest_frequency_settings(f_target=12345.678, rate=10e6, min_samples=20
 
     # The goal now is to add an integer number of these cycles up to the
     # max_samples and look for the one with the smallest remainder.
-    max_cycles = int(        max_samples/N1 )
-    min_cycles = int(_n.ceil(min_samples/N1))
+    max_cycles = int(           max_samples/N1 )
+    min_cycles = int(_math.ceil(min_samples/N1))
 
     # List of precise buffer sizes (floating point) to consider.
     # We want to pick the one that is the closest to an integer multiple
     # of buffer_increment.
-    options = _n.array(range(min_cycles,max_cycles+1)) * N1
+    options = _n.arange(min_cycles, max_cycles+1) * N1
 
-    # How close each option is to an allowed number of samples
-    mods = options % buffer_increment
-    residuals = _n.minimum(mods, abs(mods-buffer_increment))
+    # How close each option is to an allowed number of samples (in units
+    # of buffer_increment, which doesn't change which one is closest)
+    residuals = options / buffer_increment
+    residuals -= _n.round(residuals)
+    _n.abs(residuals, out=residuals)
 
     # Find the best fit.
     if len(residuals):
@@ -89,6 +99,192 @@ def get_nearest_frequency_settings(f_target=12345.678, rate=10e6, min_samples=20
     f  = n*df                       # Actual frequency that fits.
     return f, n, N
 
+def set_peak_downsampling(plot, enabled=True):
+    """
+    Asks pyqtgraph to draw only the minimum and maximum of the data falling
+    within each pixel of the supplied DataboxPlot's graphs, and nothing
+    outside the visible range, so that million-point traces plot quickly.
+    The data in the databox is untouched. Graphs created later (e.g., when
+    the number of plots changes) need another call.
+
+    Parameters
+    ----------
+    plot
+        DataboxPlot whose graphs should be downsampled.
+    enabled=True
+        Whether to downsample.
+    """
+    for w in plot.plot_widgets:
+        w.setDownsampling(auto=enabled, mode='peak')
+        w.setClipToView(enabled)
+
+def autosave_in_background(plot, executor):
+    """
+    Does the same as plot.autosave() (i.e., nothing unless the DataboxPlot's
+    autosave button is checked), but writes the file from the supplied
+    executor's thread, so the caller can get on with, e.g., the next
+    acquisition. The header and a copy of the columns are taken here, so
+    the plot can be changed freely afterward. The file has the same path
+    and contents as plot.autosave() would give, apart from the settings of
+    the plot's own controls. If this plot's previous file is still being
+    written, this waits for it first (while processing events), so a slow
+    disk can't build up a backlog.
+
+    Plots (or DataboxPlot subclasses) that replace save_file() or
+    autosave() are just autosaved normally.
+
+    Parameters
+    ----------
+    plot
+        DataboxPlot to autosave.
+
+    executor
+        concurrent.futures executor to write the file with.
+
+    Returns
+    -------
+    The future for the write, or None if autosave is off (or not in the background).
+    """
+    # Honor any custom saving
+    if not getattr(plot.save_file, '__func__', None) is _g.DataboxPlot.save_file \
+    or not getattr(plot.autosave,  '__func__', None) is _g.DataboxPlot.autosave:
+        plot.autosave()
+        return None
+
+    if not plot.button_autosave.is_checked(): return None
+
+    # Wait for the previous write
+    f = getattr(plot, '_autosave_future', None)
+    while f is not None and not f.done(): plot.sleep(0.001, 0.001)
+
+    # Let autosave() work out the path (and increment the counter), but
+    # hand the writing of a snapshot to the executor instead.
+    def save_file(path=None, **kwargs):
+        plot.before_save_file()
+        plot.h(**{'DataboxPlot_Note' : plot.text_log_note(),})
+        d = _s.data.databox(delimiter=plot.delimiter).copy_all(plot)
+        plot._autosave_future = executor.submit(d.save_file, path,
+            plot.file_type, plot.file_type, binary=plot.combo_binary.get_text(), **kwargs)
+
+    plot.save_file = save_file
+    try:     plot.autosave()
+    finally: del plot.save_file
+
+    return plot._autosave_future
+
+def is_tab_showing(tabs, tab):
+    """
+    Returns True if the supplied tab (from tabs.add_tab()) of the TabArea
+    tabs is on screen, i.e., it is the current tab or it has been popped
+    out into its own window.
+
+    Parameters
+    ----------
+    tabs
+        TabArea holding the tab.
+
+    tab
+        The tab in question.
+    """
+    if tab.index in tabs.popped_tabs: return True
+    n = tabs.get_current_tab()
+    return 0 <= n < len(tabs.docked_tabs) and tabs.docked_tabs[n] is tab
+
+class event_pump():
+    """
+    Callable object that processes the pending Qt events for at most
+    max_time (ms) per call, and returns immediately when Qt can tell us
+    nothing is pending (Qt5 hasPendingEvents()). This is a cheaper
+    alternative to calling window.process_events() many times in a tight loop.
+
+    Create it after the QApplication exists (e.g., after making a window).
+
+    Parameters
+    ----------
+    max_time=5
+        Maximum time (ms) to spend processing events per call.
+    """
+    def __init__(self, max_time=5):
+        QtCore = _egg.pyqtgraph.Qt.QtCore
+
+        # Look everything up once
+        self._app         = QtCore.QCoreApplication.instance()
+        self._has_pending = getattr(self._app, 'hasPendingEvents', None)
+        self._flags       = getattr(QtCore.QEventLoop, 'ProcessEventsFlag', QtCore.QEventLoop).AllEvents
+        self._max_time    = int(max_time)
+
+    def __call__(self, *a):
+        if self._has_pending and not self._has_pending(): return
+        self._app.processEvents(self._flags, self._max_time)
+
+class ring_buffer():
+    """
+    Fixed-size history of the most recent samples of a few channels, held
+    in a single preallocated array whose length is a power of two, so that
+    adding data never allocates and wrapping is a bit mask. Data can be
+    added from one thread and read from another.
+
+    Parameters
+    ----------
+    channels=2
+        Number of channels (rows).
+
+    size=8192
+        Minimum number of samples to keep for each channel; rounded up to
+        the next power of two.
+
+    dtype=float
+        Data type of the stored samples.
+    """
+    def __init__(self, channels=2, size=8192, dtype=float):
+        self.size  = 1 << max(int(size)-1, 0).bit_length()
+        self.data  = _n.zeros((channels, self.size), dtype=dtype)
+        self.count = 0 # Total number of samples ever added
+        self._mask = self.size-1
+        self._lock = _threading.Lock()
+
+    def __len__(self): return min(self.count, self.size)
+
+    def append(self, *values):
+        """
+        Adds one sample per channel.
+        """
+        with self._lock:
+            self.data[:, self.count & self._mask] = values
+            self.count += 1
+
+    def extend(self, *arrays):
+        """
+        Adds an array of samples per channel (all the same length). Only the
+        last self.size samples are kept.
+        """
+        n = len(arrays[0])
+        k = min(n, self.size)        # How many we keep
+        i = (self.count+n-k) & self._mask # Where the first one goes
+        m = min(k, self.size-i)      # How many fit before wrapping
+        with self._lock:
+            for row in range(len(arrays)):
+                a = arrays[row][n-k:]
+                self.data[row, i:i+m] = a[:m]
+                self.data[row, :k-m]  = a[m:]
+            self.count += n
+
+    def get(self):
+        """
+        Returns a new (channels, len(self)) array of the stored samples, oldest
+        first.
+        """
+        with self._lock:
+            if self.count <= self.size: return self.data[:, :self.count].copy()
+            i = self.count & self._mask
+            return _n.concatenate((self.data[:, i:], self.data[:, :i]), axis=1)
+
+    def clear(self):
+        """
+        Forgets all the samples.
+        """
+        with self._lock: self.count = 0
+
 class data_processor(_g.Window):
     """
     Tab area containing a raw data tab and signal processing tabs.
@@ -153,6 +349,12 @@ class data_processor(_g.Window):
 
     run = process_data
 
+# Settings (below the waveform's key) that determine each generated waveform
+_waveform_parameters = dict(
+    Sine        = ['Cycles', 'Amplitude', 'Offset', 'Phase'],
+    Square      = ['Cycles', 'High', 'Low', 'Start', 'Width'],
+    Pulse_Decay = ['Amplitude', 'Offset', 'Tau', 'Zero'])
+
 class waveform_designer(_g.Window):
     """
     Base GUI for creating output waveforms.
@@ -202,6 +404,9 @@ class waveform_designer(_g.Window):
         self._rates = rates
         self._channels = []
 
+        # Last generated waveform for each channel, with the settings that made it
+        self._waveform_cache = dict()
+
         # Settings tabs
         self.new_autorow()
         self.tabs_settings = self.add(_g.TabArea(autosettings_path=name+'.tabs_settings'))
@@ -247,41 +452,54 @@ class waveform_designer(_g.Window):
         N = int(s[c+'/Samples'])    # Number of samples
         R = self.get_rate(c)    # Sampling rate in Hz
 
-        # Get the time array
-        t = p['t_'+c] = _n.linspace(0,(N-1)/R,N)
-
         # Don't adjust the voltages if custom mode unless the lengths don't match
         if w == 'Custom':
+            t = p['t_'+c] = _n.linspace(0,(N-1)/R,N)
             if not len(t) == len(p[c]): p[c] = _n.zeros(len(t))
             return
 
-        # Get the frequency and period for generating the other waveforms
+        # If none of the relevant settings changed, copy the last waveform
+        # (copies, so that editing the plotted data can't spoil the cache)
+        key = (w, N, R) + tuple(s[c+'/'+w+'/'+k] for k in _waveform_parameters[w])
+        if w in ['Sine', 'Square']: key = key + (s[c+'/'+w],)
+        if c in self._waveform_cache and self._waveform_cache[c][0] == key:
+            p['t_'+c] = self._waveform_cache[c][1].copy()
+            p[c]      = self._waveform_cache[c][2].copy()
+            return
+
+        # Get the time array
+        t = p['t_'+c] = _n.linspace(0,(N-1)/R,N)
+
+        # Get the frequency for generating the other waveforms
         if w in ['Sine', 'Square']:
             f = s[c+'/'+w]              # Frequency in Hz
-            if f: T = 1.0/f             # Period (sec)
-            else: T = 0
 
         # Get the waveform
         if   w == 'Sine':
-            p[c] = s[c+'/Sine/Offset'] + s[c+'/Sine/Amplitude']*_n.sin((2*_n.pi*f)*t + s[c+'/Sine/Phase']*_n.pi/180.0)
+
+            # The samples repeat every N/gcd(N,Cycles) samples (e.g., every
+            # period if they hold a whole number of periods), so only
+            # calculate the first repeat and tile it.
+            cycles = s[c+'/Sine/Cycles']
+            if cycles > 1 and cycles == int(cycles): M = N//_math.gcd(N, int(cycles))
+            else:                                    M = N
+
+            v = s[c+'/Sine/Offset'] + s[c+'/Sine/Amplitude']*_n.sin((2*_n.pi*f)*t[0:M] + s[c+'/Sine/Phase']*_n.pi/180.0)
+            p[c] = _n.tile(v, N//M)
 
         elif w == 'Square':
 
             # Start with the "low" values
             v = _n.full(N, s[c+'/Square/Low'])
 
-            # Get the pulse up and down times for one cycle
-            t1 = T*s[c+'/Square/Start']
-            t2 = T*s[c+'/Square/Width'] + t1
-
-            # Loop over the segments adding "high" values
-            for n in range(s[c+'/Square/Cycles']):
-
-                # Start of cycle
-                t0 = n*T
-
-                # Set the high value for this cycle
-                v[_n.logical_and(t>=t0+t1, t<t0+t2)] = s[c+'/Square/High']
+            # Set the "high" values, which start a fraction "Start" of the way
+            # into each of the first "Cycles" periods, and last "Width" periods.
+            # Phases are rounded to 1e-9 periods so that round-off cannot move
+            # an edge that lands exactly on a sample.
+            if f:
+                x = _n.round(t*f - s[c+'/Square/Start'], 9) # Periods since the first rising edge
+                n = _n.floor(x)                             # Index of the cycle
+                v[(_n.round(x-n, 9) < s[c+'/Square/Width']) & (n >= 0) & (n < s[c+'/Square/Cycles'])] = s[c+'/Square/High']
 
             # Set it
             p[c] = v
@@ -291,6 +509,9 @@ class waveform_designer(_g.Window):
             if s[c+'/Pulse_Decay/Zero']:
                 p[c][-1] = 0
 
+        # Remember it
+        self._waveform_cache[c] = (key, _n.array(p['t_'+c]), _n.array(p[c]))
+
     def _settings_changed(self, *a):
         """
         When someone changes the ao settings, update the waveform.
@@ -378,11 +599,12 @@ class waveform_designer(_g.Window):
         p = self.plot_design
         s.send_to_databox_header(p)
 
-        # Calculate the frequencies from the Repetitions etc and generate the waveform data
-        for w in ['Sine', 'Square']:
-            for c in self._channels:
-                self._update_waveform_frequency(c, w)
-                self._generate_waveform(c)
+        # Calculate the frequencies from the Repetitions etc and generate the
+        # waveform data (once per channel; _generate_waveform() reuses the
+        # last one if none of its settings changed)
+        for c in self._channels:
+            for w in ['Sine', 'Square']: self._update_waveform_frequency(c, w)
+            self._generate_waveform(c)
 
         # Plot it
         p.plot()
@@ -392,7 +614,8 @@ class waveform_designer(_g.Window):
         Returns the frequency for the settings under the specified root (e.g. c='Ch1', w='Sine')
         """
         s = self.settings
-        s.set_value(c+'/'+w, self.get_rate(c)/s[c+'/Samples']*s[c+'/'+w+'/Cycles'], block_key_signals=True)
+        f = self.get_rate(c)/s[c+'/Samples']*s[c+'/'+w+'/Cycles']
+        if not s[c+'/'+w] == f: s.set_value(c+'/'+w, f, block_key_signals=True)
 
     def add_channels(self, *args, rates=None):
         """
@@ -775,20 +998,27 @@ class quadratures(_g.Window):
         # Assumed column pairs
         row  = [self.number_iteration_total(), f]
         keys = ['n', 'f(Hz)']
+        t_last = None
         for n in range(0, len(d), 2):
 
-            # Get the time axis and the two quadratures
+            # Get the time axis and the two quadratures, unless this pair
+            # shares the previous pair's time array (e.g., simultaneously
+            # sampled channels)
             t = d[n]
-            X = _n.cos(2*_n.pi*f*t)
-            Y = _n.sin(2*_n.pi*f*t)
-
-            # Normalize
-            X = _n.nan_to_num(X/sum(X*X))
-            Y = _n.nan_to_num(Y/sum(Y*Y))
-
-            # Get quadratures
-            VX = sum(d[n+1]*X)
-            VY = sum(d[n+1]*Y)
+            if t is not t_last:
+                w = (2*_n.pi*f)*t
+                X = _n.cos(w)
+                Y = _n.sin(w)
+                XX = _n.dot(X,X)
+                YY = _n.dot(Y,Y)
+                t_last = t
+
+            # Get the (normalized) quadratures. Dot products run in one C
+            # loop each, whereas the built-in sum() steps through the array
+            # in Python. A zero norm (e.g., Y at f=0) gives zero.
+            V  = d[n+1]
+            VX = _n.dot(V,X)/XX if XX else 0.0
+            VY = _n.dot(V,Y)/YY if YY else 0.0
 
             # Append to the row
             row  = row  + [VX, VY]
@@ -841,8 +1071,17 @@ class quadratures(_g.Window):
         if f==0: return self
         
         # Loop over the data.
+        t_last = None
         for n in range(0, len(d), 2):
             
+            # If this pair shares the previous pair's time array, share the
+            # truncated one as well (stored directly so it stays shared)
+            if d[n] is t_last:
+                d.columns[d.ckeys[n]] = d[n-2]
+                d[n+1] = d[n+1][0:len(d[n-2])]
+                continue
+            t_last = d[n]
+
             # Get the time step and total time
             dt = d[n][1] -d[n][0]
             T  = d[n][-1]-d[n][0]
@@ -1,10 +1,14 @@
 import numpy   as _n
 import time    as _time
+import csv     as _csv
 import spinmob as _s
 import spinmob.egg as _egg
 _g = _egg.gui
 import mcphysics as _mp
 
+try: from . import _gui_tools as _gt
+except: _gt = _mp.instruments._gui_tools
+
 _debug_enabled = False
 _debug = _mp._debug
 _p = _mp._p
@@ -32,6 +36,18 @@ class keithley_dmm_api():
         Visa implementation seems to be Rhode & Schwarz (streamlined) or NI-VISA (bloaty),
         with pyvisa_py=False.
 
+    auto_read=False
+        If True, and the (Prologix) GPIB adapter supports it, put the adapter
+        in "++auto 1" mode, so it reads the instrument's response after every
+        write. This saves sending "++read" before every read, but the adapter
+        then asks for a reading immediately after the channel is selected,
+        before the scanner has switched and settled, so the reading can
+        belong to the previous channel. Only use this with a single channel.
+
+    simulation_delay=0.001
+        How long a simulated reading takes (sec). Keep this small so demos and
+        tests run quickly.
+
     NOTE
     ----
     At some point we should inherit the common functionality of these visa
@@ -41,7 +57,7 @@ class keithley_dmm_api():
 
 
 
-    def __init__(self, name='ASRL3::INSTR', pyvisa_py=False):
+    def __init__(self, name='ASRL3::INSTR', pyvisa_py=False, auto_read=False, simulation_delay=0.001):
         if not _mp._visa: _s._warn('You need to install pyvisa to use the Keithley DMMs.')
 
         # Create a resource management object
@@ -51,7 +67,13 @@ class keithley_dmm_api():
         else: self.resource_manager = None
 
         # Get time t=t0
-        self._t0 = _time.time()
+        self.reset_clock()
+
+        # How long a simulated reading takes (sec)
+        self._simulation_delay = simulation_delay
+
+        # Whether the adapter reads automatically after each write
+        self._auto_read = False
 
         # Try to open the instrument.
         try:
@@ -67,7 +89,9 @@ class keithley_dmm_api():
                 s = self.query('U0X')
 
                 # DMM model 199
-                if s[0:3] in ['100', '199']: self.model = 'KEITHLEY199'
+                if s[0:3] in ['100', '199']:
+                    self.model = 'KEITHLEY199'
+                    if auto_read: self._auto_read = self._enable_auto_read()
                 else:
                     print("ERROR: Currently we only handle Keithley 199 DMMs")
                     self.instrument.close()
@@ -98,7 +122,7 @@ class keithley_dmm_api():
             Optional function to be called in between communications, e.g., to
             update a gui.
         """
-        _debug('write('+"'"+message+"'"+')')
+        _debug('write()', message)
 
         if self.instrument == None: s = None
         else:                       s = self.instrument.write(message)
@@ -106,6 +130,20 @@ class keithley_dmm_api():
         if process_events: process_events()
         return s
 
+    def _enable_auto_read(self):
+        """
+        Tries to put the GPIB adapter in "++auto 1" mode, returning True if
+        the adapter confirms it.
+        """
+        _debug('_enable_auto_read()')
+        try:
+            self.instrument.write('++auto 1')
+            self.instrument.write('++auto')
+            return self.instrument.read().strip() == '1'
+        except:
+            _s._warn('Could not enable ++auto mode; using ++read.')
+            return False
+
     def read(self, process_events=False):
         """
         Reads a message and returns it.
@@ -117,7 +155,9 @@ class keithley_dmm_api():
             update a gui.
         """
         _debug('read()')
-        self.write('++read 10')
+
+        # Tell the adapter to read, unless it already does so automatically
+        if not self._auto_read: self.write('++read 10')
 
         if process_events: process_events()
 
@@ -126,14 +166,14 @@ class keithley_dmm_api():
 
         if process_events: process_events()
 
-        _debug('  '+repr(response))
+        _debug('  response', response)
         return response.strip()
 
     def query(self, message='U0X', process_events=False):
         """
         Writes the supplied message and reads the response.
         """
-        _debug("query('"+message+"')")
+        _debug('query()', message)
 
         self.write(message, process_events)
         return self.read(process_events)
@@ -160,6 +200,15 @@ class keithley_dmm_api():
         """
         self.write("++llo")
 
+    def reset_clock(self):
+        """
+        Sets time t=0 for get_voltage() to now. The wall-clock time is stored
+        in self._t0, while the times themselves come from the (monotonic,
+        high-resolution) performance counter.
+        """
+        self._t0         = _time.time()
+        self._t0_counter = _time.perf_counter()
+
     def get_voltage(self, channel=1, process_events=False):
         """
         Returns the time just after reading the voltage and voltage value
@@ -175,8 +224,8 @@ class keithley_dmm_api():
         """
         # Simulation mode
         if self.instrument == None:
-            _time.sleep(0.4)
-            return _time.time() - self._t0, _n.random.rand()
+            _time.sleep(self._simulation_delay)
+            return _time.perf_counter() - self._t0_counter, _n.random.rand()
 
         # Real deal
         elif self.model == 'KEITHLEY199':
@@ -189,14 +238,17 @@ class keithley_dmm_api():
                 s = self.read(process_events)
             except:
                 print("ERROR: Timeout on channel "+str(channel))
-                return _time.time() - self._t0, _n.nan
+                return _time.perf_counter() - self._t0_counter, _n.nan
+
+            # Time just after the reading
+            t = _time.perf_counter() - self._t0_counter
 
             # Return the voltage
             try:
-                return _time.time() - self._t0, float(s[4:].strip())
+                return t, float(s[4:].strip())
             except:
                 print("ERROR: Bad format "+repr(s))
-                return _time.time() - self._t0, _n.nan
+                return t, _n.nan
 
 #            # Tell it to trigger
 #            self.write("++trg")
@@ -234,7 +286,9 @@ class keithley_dmm_api():
         Closes the connection to the device.
         """
         _debug("close()")
-        if not self.instrument == None: self.instrument.close()
+        if not self.instrument == None:
+            if self._auto_read: self.instrument.write('++auto 0')
+            self.instrument.close()
 
 
 class keithley_dmm(_g.BaseObject):
@@ -265,6 +319,9 @@ class keithley_dmm(_g.BaseObject):
         # Build the GUI
         self.window    = _g.Window('Keithley DMM', autosettings_path=autosettings_path+'_window')
         self.window.event_close = self.event_close
+
+        # Processes pending GUI events during acquisition (cheaply)
+        self._process_events = _gt.event_pump()
         self.grid_top  = self.window.place_object(_g.GridLayout(False))
         self.window.new_autorow()
         self.grid_bot  = self.window.place_object(_g.GridLayout(False), alignment=0)
@@ -309,6 +366,14 @@ class keithley_dmm(_g.BaseObject):
 
         # Acquisition settings
         self.settings.add_parameter('Acquire/Unlock', True, tip='Unlock the device\'s front panel after acquisition.')
+        self.settings.add_parameter('Acquire/Plot_Interval', 0.05, bounds=(0,None), siPrefix=True, suffix='s', dec=True, tip='Minimum time between plot updates during acquisition.')
+
+        # Single-shot timer driving the acquisition; _acquire_step() re-arms it
+        # after each line of data, so the window stays responsive between them.
+        self.timer_acquire = _g.Timer(interval_ms=0, single_shot=True)
+        self.timer_acquire.signal_tick.connect(self._acquire_step)
+        self._acquiring    = False # Between starting and cleaning up
+        self._acquire_busy = False # In the middle of _acquire_step()
 
         # Connect all the signals
         self.button_connect.signal_clicked.connect(self._button_connect_clicked)
@@ -370,11 +435,17 @@ class keithley_dmm(_g.BaseObject):
     def _button_acquire_clicked(self, *a):
         """
         Get the enabled curves, storing them in plot_raw.
+
+        This only starts the acquisition, which then runs from
+        self.timer_acquire until the button is unchecked, so it (and
+        self.button_acquire.click()) returns right away. Use
+        wait_until_finished() to wait for it.
         """
         _debug('_button_acquire_clicked()')
 
-        # Don't double-loop!
-        if not self.button_acquire.is_checked(): return
+        # Don't double-loop! This includes re-checking the button before the
+        # loop noticed it was unchecked; it just keeps going.
+        if not self.button_acquire.is_checked() or self._acquiring: return
 
         # Don't proceed if we have no connection
         if self.api == None:
@@ -390,7 +461,7 @@ class keithley_dmm(_g.BaseObject):
         # Update the label
         self.label_path.set_text('Output Path: ' + self.path)
 
-        _debug('  path='+repr(self.path))
+        _debug('  path', self.path)
 
         # Disable the connection button
         self._set_acquisition_mode(True)
@@ -398,55 +469,114 @@ class keithley_dmm(_g.BaseObject):
         # For easy coding
         d = self.plot_raw
 
-        # Set up the databox columns
+        # Find the enabled channels and their column keys once; the buttons
+        # are disabled during acquisition, so this list can't change.
+        self._channels = [(n+1, 't'+str(n+1), 'v'+str(n+1))
+                          for n in range(len(self.buttons)) if self.buttons[n].is_checked()]
+
+        # Set up the databox columns, and the lists that accumulate the data
+        # (appending to a list is cheap; appending to an array copies it)
         _debug('  setting up databox')
         d.clear()
-        for n in range(len(self.buttons)):
-            if self.buttons[n].is_checked():
-                d['t'+str(n+1)] = []
-                d['v'+str(n+1)] = []
+        self._buffers = dict()
+        for c, tk, vk in self._channels:
+            d[tk] = []
+            d[vk] = []
+            self._buffers[tk] = []
+            self._buffers[vk] = []
+
+        # Keep the dump file open for the whole acquisition
+        self._dump_open()
+        self._acquiring = True
+        try:
+            # Reset the clock and record it as header
+            self.api.reset_clock()
+            self._dump(['Date:', _time.ctime()])
+            self._dump(['Time:', self.api._t0])
+
+            # And the column labels!
+            self._dump(self.plot_raw.ckeys)
 
-        # Reset the clock and record it as header
-        self.api._t0 = _time.time()
-        self._dump(['Date:', _time.ctime()], 'w')
-        self._dump(['Time:', self.api._t0])
+        except:
+            self._finish_acquisition()
+            raise
 
-        # And the column labels!
-        self._dump(self.plot_raw.ckeys)
+        # Time of the last plot update
+        self._t_last_plot = 0
 
-        # Loop until the user quits
+        # Start the event-driven loop; each tick takes one line of data.
         _debug('  starting the loop')
-        while self.button_acquire.is_checked():
+        self.timer_acquire.start()
+
+    def _acquire_step(self, *a):
+        """
+        Called by self.timer_acquire: reads each enabled channel once, dumps
+        the line, and re-arms the timer until the acquire button is unchecked.
+        """
+        # Still in the previous step (which processes events, and will re-arm
+        # the timer when it's done)
+        if self._acquire_busy: return
 
+        # User quit
+        if not self.button_acquire.is_checked():
+            self._finish_acquisition()
+            return
+
+        # For easy coding
+        get_voltage    = self.api.get_voltage
+        process_events = self._process_events
+        buffers        = self._buffers
+
+        self._acquire_busy = True
+        try:
             # Next line of data
             data = []
 
             # Get all the voltages we're supposed to
-            for n in range(len(self.buttons)):
-
-                # If the button is enabled, get the time and voltage
-                if self.buttons[n].is_checked():
-
-                    _debug('    getting the voltage')
+            for c, tk, vk in self._channels:
 
-                    # Get the time and voltage, updating the window in between commands
-                    t, v = self.api.get_voltage(n+1, self.window.process_events)
+                _debug('    getting the voltage')
 
-                    # Append the new data points
-                    d['t'+str(n+1)] = _n.append(d['t'+str(n+1)], t)
-                    d['v'+str(n+1)] = _n.append(d['v'+str(n+1)], v)
+                # Get the time and voltage, updating the window in between commands
+                t, v = get_voltage(c, process_events)
 
-                    # Update the plot
-                    self.plot_raw.plot()
-                    self.window.process_events()
+                # Append the new data points
+                buffers[tk].append(t)
+                buffers[vk].append(v)
 
-                    # Append this to the list
-                    data = data + [t,v]
+                # Append this to the list
+                data.append(t)
+                data.append(v)
 
             # Write the line to the dump file
             self._dump(data)
 
-        _debug('  Loop complete!')
+            # Update the plot, but not more often than the user wants
+            if _time.time() - self._t_last_plot >= self.settings['Acquire/Plot_Interval']:
+                self._update_plot()
+
+        # Make sure everything makes it to disk
+        except:
+            self.button_acquire.set_checked(False, block_signals=True)
+            self._finish_acquisition()
+            raise
+
+        finally: self._acquire_busy = False
+
+        # Next line
+        self.timer_acquire.start()
+
+    def _finish_acquisition(self):
+        """
+        Closes the dump file, plots everything, and unlocks the controls.
+        """
+        _debug('_finish_acquisition()')
+
+        # Make sure everything makes it to disk
+        self._dump_close()
+
+        # Make sure the plot shows everything
+        self._update_plot()
 
         # Unlock the front panel if we're supposed to
         if self.settings['Acquire/Unlock']: self.api.unlock()
@@ -454,26 +584,61 @@ class keithley_dmm(_g.BaseObject):
         # Re-enable the connect button
         self._set_acquisition_mode(False)
 
-    def _dump(self, a, mode='a'):
+        # Done. Ignore any click while cleaning up, rather than leave the
+        # button checked with nothing running.
+        self._acquiring = False
+        self.button_acquire.set_checked(False, block_signals=True)
+
+    def wait_until_finished(self):
         """
-        Opens self.path, writes the list a, closes self.path. mode is the file
-        open mode.
+        Processes events until the acquisition (started with the acquire
+        button, and stopped by unchecking it) is finished and cleaned up.
         """
-        _debug('_dump('+str(a)+', '+ repr(mode)+')')
+        while self._acquiring: self.window.sleep(0.001, 0.001)
+
+    def _update_plot(self):
+        """
+        Transfers the accumulated data to the databox columns and plots it.
+        """
+        for k in self._buffers: self.plot_raw[k] = self._buffers[k]
+        self.plot_raw.plot()
+        self._t_last_plot = _time.time()
+
+    def _dump_open(self):
+        """
+        Opens (overwrites) self.path for writing with _dump().
+        """
+        _debug('_dump_open()')
+        self._dump_file   = open(self.path, 'w', buffering=1<<16, newline='')
+        self._dump_writer = _csv.writer(self._dump_file, lineterminator='\n')
+        self._dump_rows   = 0
+
+    def _dump(self, a, flush_every=100):
+        """
+        Writes the list a as a comma-separated line to the open dump file,
+        flushing it to disk every flush_every lines.
+        """
+        _debug('_dump()', a)
 
-        # Make sure everything is a string
-        for n in range(len(a)): a[n] = str(a[n])
-        self.a = a
         # Write it.
-        f = open(self.path, mode)
-        f.write(','.join(a)+'\n')
-        f.close()
+        self._dump_writer.writerow(a)
+
+        # Flush periodically so the file is usable during long runs.
+        self._dump_rows += 1
+        if self._dump_rows % flush_every == 0: self._dump_file.flush()
+
+    def _dump_close(self):
+        """
+        Closes the dump file opened by _dump_open().
+        """
+        _debug('_dump_close()')
+        self._dump_file.close()
 
     def _set_acquisition_mode(self, mode=True):
         """
         Enables / disables the appropriate buttons, depending on the mode.
         """
-        _debug('_set_acquisition_mode('+repr(mode)+')')
+        _debug('_set_acquisition_mode()', mode)
         self.button_connect.disable(mode)
         for b in self.buttons: b.disable(mode)
 
@@ -1,5 +1,7 @@
 import numpy   as _n
 import time    as _t
+import concurrent.futures as _futures
+import threading as _threading
 import spinmob as _s
 import spinmob.egg as _egg
 _g = _egg.gui
@@ -8,9 +10,36 @@ import mcphysics as _mp
 try: from . import _visa_tools
 except: _visa_tools = _mp.instruments._visa_tools
 
+try: from . import _gui_tools as _gt
+except: _gt = _mp.instruments._gui_tools
+
 _mp._debug_enabled = False
 _debug = _mp._debug
 
+def _column_references(d):
+    """
+    Returns a dictionary of references to (not copies of) the columns of
+    databox d, keyed by column name, in order.
+    """
+    return dict([(k, d[k]) for k in d.ckeys])
+
+def _columns_equal(a, b):
+    """
+    Returns True if the column dictionaries a and b (see _column_references())
+    have the same keys and identical data. Since new traces almost always
+    differ, the cheap checks (same array, length, last sample) come before
+    the full (vectorized) comparison.
+    """
+    if not list(a.keys()) == list(b.keys()): return False
+    for k in a:
+        x = _n.asarray(a[k])
+        y = _n.asarray(b[k])
+        if x is y: continue
+        if not x.shape == y.shape: return False
+        if x.size and not x[-1] == y[-1]: return False
+        if not _n.array_equal(x, y): return False
+    return True
+
 class sillyscope_api(_visa_tools.visa_api_base):
     """
     Class for talking to a Tektronix TDS/TBS 1000 series and Rigol 1000 B/D/E/Z
@@ -33,18 +62,59 @@ class sillyscope_api(_visa_tools.visa_api_base):
     write_sleep=0.01
         How long to sleep after a write operation (sec)
 
-    """
+    chunk_size=2**20
+        Size (bytes) of the low-level VISA reads. The pyvisa default (20 kB)
+        splits large waveform transfers into many reads.
 
+    """
 
-    def __init__(self, name='TDS1012B', pyvisa_py=False, simulation=False, timeout=3e3, write_sleep=0.0):
+    # Model-specific commands. None means nothing needs to be sent.
+    _commands_clear = dict(
+        RIGOLZ    = ':CLE',
+        RIGOLB    = ':DISP:CLE',
+        RIGOLDE   = ':DISP:CLE')
+    _commands_trigger_single = dict(
+        TEKTRONIX = 'ACQ:STATE 1',
+        RIGOLDE   = ':RUN',
+        RIGOLZ    = ':SING',
+        RIGOLB    = ':KEY:SING')
+    _commands_set_channel = dict(
+        TEKTRONIX = 'DATA:SOURCE CH%d',
+        RIGOLDE   = None, # DE Relies on a channel specified with the data query
+        RIGOLB    = ':WAV:SOUR CHAN%d',
+        RIGOLZ    = ':WAV:SOUR CHAN%d')
+
+    # Waveform queries for the current channel (%d is filled with it, if present)
+    _commands_waveform = dict(
+        TEKTRONIX = 'CURV?',
+        RIGOLDE   = ':WAV:DATA? CHAN%d',
+        RIGOLB    = ':WAV:DATA?',
+        RIGOLZ    = ':WAV:DATA?')
+
+    # Waveform queries that also select the channel, for compound commands
+    _commands_waveforms = dict(
+        TEKTRONIX = ':DATA:SOURCE CH%d;:CURV?',
+        RIGOLDE   = ':WAV:DATA? CHAN%d',
+        RIGOLB    = ':WAV:SOUR CHAN%d;:WAV:DATA?',
+        RIGOLZ    = ':WAV:SOUR CHAN%d;:WAV:DATA?')
+
+    def __init__(self, name='TDS1012B', pyvisa_py=False, simulation=False, timeout=3e3, write_sleep=0.0, chunk_size=2**20):
         if not _mp._visa: _s._warn('You need to install pyvisa to use the sillyscopes.')
 
+        # Held while talking to the scope, so a background transfer (see
+        # get_waveforms_async()) and other commands can't interleave.
+        self._lock = _threading.RLock()
+
         # Run the basic stuff
         _visa_tools.visa_api_base.__init__(self, name=name, pyvisa_py=pyvisa_py, simulation=simulation, timeout=timeout, write_sleep=write_sleep)
 
+        # Read the (binary) waveforms in big chunks
+        if self.instrument: self.instrument.chunk_size = chunk_size
+
         # Simulation settings
-        self._simulation_sleep  = 0.01
+        self._simulation_sleep  = 0.001
         self._simulation_points = 1200
+        self._simulation_x      = None
 
         # Set up the info
         self.t_duty_cycle = 0
@@ -56,6 +126,8 @@ class sillyscope_api(_visa_tools.visa_api_base):
         self.previous_header[4] = dict(xzero4=0, xmultiplier4=1, yzero4=0, ymultiplier4=1)
         self.model = None
         self._channel = 1
+        self._channel_written = False # Whether the scope's source is known to be self._channel
+        self._thread_pool = None      # Created by get_waveforms_async() as needed
 
 
         # Remember if it's a Tektronix scope
@@ -76,6 +148,24 @@ class sillyscope_api(_visa_tools.visa_api_base):
         # Poop out.
         else: self.model=None
 
+        # Look up the model-specific methods and commands once, so the
+        # per-acquisition calls don't have to check the model every time.
+        self._get_header_model = dict(
+            TEKTRONIX = self._get_header_tektronix,
+            RIGOLDE   = self._get_header_rigolde,
+            RIGOLB    = self._get_header_rigolb,
+            RIGOLZ    = self._get_header_rigolz).get(self.model)
+        self._decode_waveform_model = dict(
+            TEKTRONIX = self._decode_waveform_tektronix,
+            RIGOLDE   = self._decode_waveform_rigolde,
+            RIGOLB    = self._decode_waveform_rigolb,
+            RIGOLZ    = self._decode_waveform_rigolz).get(self.model)
+        self._command_clear          = self._commands_clear         .get(self.model)
+        self._command_trigger_single = self._commands_trigger_single.get(self.model)
+        self._command_set_channel    = self._commands_set_channel   .get(self.model)
+        self._command_waveform       = self._commands_waveform      .get(self.model)
+        self._command_waveforms      = self._commands_waveforms     .get(self.model)
+
         # Set the type of encoding for the binary data returned
         self.set_binary_encoding()
 
@@ -93,19 +183,19 @@ class sillyscope_api(_visa_tools.visa_api_base):
         """
         Sends the supplied message and returns the response.
         """
-        _debug('query('+"'"+message+"'"+')')
+        _debug('query()', message)
 
         if self.instrument == None: return
-        else:                       return self.instrument.query(message)
+        with self._lock:            return self.instrument.query(message)
 
     def write(self, message):
         """
         Writes the supplied message.
         """
-        _debug('write('+"'"+message+"'"+')')
+        _debug('write()', message)
 
         if self.instrument == None: return
-        else:                       return self.instrument.write(message)
+        with self._lock:            return self.instrument.write(message)
 
     def read (self):
         """
@@ -114,7 +204,7 @@ class sillyscope_api(_visa_tools.visa_api_base):
         _debug('read()')
 
         if self.instrument == None: return
-        else:                       return self.instrument.read()
+        with self._lock:            return self.instrument.read()
 
     def read_raw(self):
         """
@@ -123,14 +213,13 @@ class sillyscope_api(_visa_tools.visa_api_base):
         _debug('read_raw()')
 
         if self.instrument == None: return
-        else:                       return self.instrument.read_raw()
+        with self._lock:            return self.instrument.read_raw()
 
     def clear(self):
         """
         Clears the display if possible.
         """
-        if   self.model in ['RIGOLZ']:           self.write(':CLE')
-        elif self.model in ['RIGOLB','RIGOLDE']: self.write(':DISP:CLE')
+        if self._command_clear: self.write(self._command_clear)
 
     def get_waveform(self, channel=1, convert_to_float=True, include_x=True, use_previous_header=False, binary=None):
         """
@@ -193,9 +282,17 @@ class sillyscope_api(_visa_tools.visa_api_base):
             # For duty cycle calculation
             t1 = _t.time()
 
-            # Create the fake data
-            d = _s.fun.generate_fake_data('5*sin(20*(1+random.normal(0,0.04,len(x)))*x + random.normal(0,4))', _n.linspace(-5,5,self._simulation_points),
-                                          ey=20, include_errors=False)
+            # Build the x-axis once; only the jitter and noise change per call.
+            if self._simulation_x is None or len(self._simulation_x) != self._simulation_points:
+                self._simulation_x = _n.linspace(-5,5,self._simulation_points)
+                self._simulation_20x = 20*self._simulation_x
+            N = len(self._simulation_x)
+
+            # Create the fake data, named to simulate the scope output
+            d = _s.data.databox()
+            d['x']   = self._simulation_x
+            d['y'+c] = 5*_n.sin(self._simulation_20x*(1+_n.random.normal(0,0.04,N)) + _n.random.normal(0,4)) \
+                     + _n.random.normal(0,20,N)
 
             # Fake the acquisition time
             _t.sleep(self._simulation_sleep)
@@ -203,27 +300,24 @@ class sillyscope_api(_visa_tools.visa_api_base):
             # For duty cycle calculation
             t2 = _t.time()
 
-            # Rename the columns to simulate the scope output
-            d.rename_column(0, 'x')
-            d.rename_column(1, 'y'+c)
-
             # Shorten the bitdepth
             d[1] = _n.float16(_n.int8(d[1]))
 
             # Get the fake header info.
+            yzero, ymultiplier = 1, 0.1
             d.insert_header('xzero'+c, 1)
             d.insert_header('xoffset'+c, 0)
             d.insert_header('xmultiplier'+c, 0.1)
-            d.insert_header('yzero'+c, 1)
+            d.insert_header('yzero'+c, yzero)
             d.insert_header('yoffset'+c, 0)
-            d.insert_header('ymultiplier'+c, 0.1)
+            d.insert_header('ymultiplier'+c, ymultiplier)
 
             # Remember this for next time.
             self.previous_header[channel].update(d.headers)
 
             # If we're converting to float voltages
             if convert_to_float:
-                d['y'+c] = d.h('yzero'+c) + d.h('ymultiplier'+c)*(d['y'+c])
+                d['y'+c] = yzero + ymultiplier*d['y'+c]
 
             # Pop the time column if necessary
             if not include_x: d.pop(0)
@@ -252,25 +346,8 @@ class sillyscope_api(_visa_tools.visa_api_base):
             t2 = _t.time()
             d.h(seconds_post_waveform_query=t2)
 
-            # Get the waveform header
-
-            # If we're using the previous header, just load in the values
-            if use_previous_header:
-                d.update_headers(self.previous_header[channel])
-
-            # Otherwise, get a new header from the instrument.
-            else: self.get_header(d)
-
-            # If we're supposed to include time, add the time column
-            if include_x:
-                d['x'] = _n.arange(0, len(v), 1)
-                d['x'] = d.h('xmultiplier'+c)*(d['x'])
-
-            # If we're converting to float voltages
-            if convert_to_float:
-                d['y'+c] = d.h('yzero'+c) + d.h('ymultiplier'+c)*(v)
-            else:
-                d['y'+c] = v
+            # Add the header and the columns
+            self._fill_waveform_databox(d, channel, v, convert_to_float, include_x, use_previous_header)
 
         # Set the binary mode
         if not binary == None: d.h(SPINMOB_BINARY=binary)
@@ -288,98 +365,146 @@ class sillyscope_api(_visa_tools.visa_api_base):
         # End of getting arrays and header information
         return d
 
-    def trigger_single(self):
+    def get_waveforms(self, channels=[1], convert_to_float=True, include_x=True, use_previous_header=False, binary=None):
         """
-        After calling self.set_mode_single_trigger(), you can call this to
-        tell it to wait for the next trigger. It's up to you to check if
-        the trigger is complete.
+        Same as get_waveform(), but for a list of channels, returning a list
+        of databoxes (one per channel, in the same order).
+
+        For more than one channel on a real scope, all the curves are requested
+        with a single compound (';'-separated) command and the binary blocks
+        are read back in order, so the transfer costs roughly one round trip
+        rather than one per channel. The headers (if requested) are still
+        queried channel by channel afterward.
+
+        Parameters
+        ----------
+        channels=[1]
+            List of integer channels to query.
+
+        See get_waveform() for the remaining parameters.
         """
-        _debug('trigger_single()')
+        _debug('get_waveforms()', channels)
 
-        if   self.model=='TEKTRONIX': self.write('ACQ:STATE 1')
-        elif self.model=='RIGOLDE':   self.write(':RUN')
-        elif self.model=='RIGOLZ':    self.write(':SING')
-        elif self.model=='RIGOLB':    self.write(':KEY:SING')
+        # Simulation mode, single channels, and the MDO (which needs the
+        # point range set per channel) just use the one-at-a-time method.
+        if self.instrument == None or len(channels) < 2 \
+        or self.model == None or 'MDO' in self.idn:
+            return [self.get_waveform(c, convert_to_float, include_x, use_previous_header, binary) for c in channels]
 
-        _debug('trigger_single() complete')
+        # For duty cycle calculation
+        t0 = t1 = _t.time()
 
+        # Transfer all the waveform information
+        try:
+            vs = self._query_and_decode_waveforms(channels)
+        except:
+            print('ERROR: Timeout getting curves.')
+            vs = [_n.array([], dtype=_n.float16)]*len(channels)
 
-    def get_header(self, d=None):
-        """
-        Updates the header of databox d to include xoffset, xmultiplier, xzero, yoffset,
-        ymultiplier, yzero. If d=None, creates a databox.
-        """
-        _debug('get_header()', str(d))
+        # For duty cycle calculation
+        t2 = _t.time()
 
-        if d==None: d = _s.data.databox()
+        # Assemble the databoxes
+        ds = []
+        for n in range(len(channels)):
+            d = _s.data.databox()
+            d.h(seconds_pre_waveform_query=t1, seconds_post_waveform_query=t2)
 
-        # For easier coding later
-        c = str(self._channel)
+            # The header queries refer to the selected source channel
+            if not use_previous_header: self.set_channel(channels[n])
+            self._fill_waveform_databox(d, channels[n], vs[n], convert_to_float, include_x, use_previous_header)
 
-        _debug('  Checking model...',
-              self.model,
-              self.model in ['TEKTRONIX'],
-              self.model in ['RIGOLDE'],
-              self.model in ['RIGOLZ','RIGOLB'])
+            if not binary == None: d.h(SPINMOB_BINARY=binary)
+            ds.append(d)
 
-        if self.model in ['TEKTRONIX']:
-            _debug('  TEKTRONIX')
+        # For duty cycle calculation
+        t3 = _t.time()
+        self.t_get_waveform = t3-t0
+        if t3-t0>0: self.transfer_duty_cycle = (t2-t1)/self.t_get_waveform
+        else:       print("WARNING: get_waveforms() total time == 0")
 
-            yinc = float(self.query('WFMP:YMUL?'))
+        # Note the duty cycle.
+        for d in ds: d.h(transfer_duty_cycle=self.transfer_duty_cycle)
 
-            d.insert_header('xzero'+c,       0)#float(self.query('WFMP:XZE?')))
-            d.insert_header('xmultiplier'+c, float(self.query('WFMP:XIN?')))
-            d.insert_header('yzero'+c,       -float(self.query('WFMP:YOF?'))*yinc)
-            d.insert_header('ymultiplier'+c, yinc)
+        _debug('get_waveforms() complete')
+        return ds
 
+    def get_waveforms_async(self, *a, **kw):
+        """
+        Runs get_waveforms() (same arguments) in a background thread, returning
+        a concurrent.futures.Future whose result() is the list of databoxes.
+        The whole transfer (including the header queries) holds self._lock,
+        so commands sent from elsewhere in the meantime wait for it to finish.
+        """
+        if self._thread_pool == None: self._thread_pool = _futures.ThreadPoolExecutor(max_workers=1)
+        return self._thread_pool.submit(self._get_waveforms_locked, *a, **kw)
 
-        elif self.model in ['RIGOLDE']:
-            _debug('  RIGOLDE')
+    def _get_waveforms_locked(self, *a, **kw):
+        """
+        Runs get_waveforms() while holding self._lock.
+        """
+        with self._lock: return self.get_waveforms(*a, **kw)
+
+    def _fill_waveform_databox(self, d, channel, v, convert_to_float=True, include_x=True, use_previous_header=False):
+        """
+        Adds the header information and the x / y columns to databox d, given
+        the transferred array of integer voltages v for the specified channel.
+        """
+        c = str(channel)
 
-            # Get the increments (empirically determined f***ing manual)
-            xinc = float(self.query(':TIM:SCAL?'))       * 0.02
-            yinc = float(self.query(':CHAN'+c+':SCAL?')) * 0.04
+        # Get the waveform header
 
-            d.insert_header('xzero'+c,       0)#float(self.query(':TIM:OFFS?')))
-            d.insert_header('xmultiplier'+c, xinc)
-            d.insert_header('yzero'+c,       -float(self.query(':CHAN'+c+':OFFS?')))
-            d.insert_header('ymultiplier'+c, yinc)
+        # If we're using the previous header, just load in the values
+        if use_previous_header:
+            d.update_headers(self.previous_header[channel])
 
+        # Otherwise, get a new header from the instrument.
+        else: self.get_header(d)
 
+        # Conversion factors
+        h = d.headers
 
-        elif self.model in ['RIGOLB']:
-            _debug('  RIGOLB')
+        # If we're supposed to include time, add the time column
+        if include_x:
+            d['x'] = h['xmultiplier'+c]*_n.arange(0, len(v), 1)
 
-            # Convert the yoffset to the Tek format
-            xinc = float(self.query(':WAV:XINC? CHAN'+c))
-            yinc = float(self.query(':WAV:YINC? CHAN'+c))
+        # If we're converting to float voltages
+        if convert_to_float:
+            yzero = h['yzero'+c]
+            ymultiplier = h['ymultiplier'+c]
+            d['y'+c] = yzero + ymultiplier*(v)
+        else:
+            d['y'+c] = v
+
+        return d
 
-            # Also get whether we're in peak detect mode, since this messes up the x-scale!
-            d.insert_header('peak_detect', self.query(':ACQ:TYPE?').strip() == 'PEAK')
-            if d.h('peak_detect'): xrescale=0.5
-            else:                  xrescale=1.0
+    def trigger_single(self):
+        """
+        After calling self.set_mode_single_trigger(), you can call this to
+        tell it to wait for the next trigger. It's up to you to check if
+        the trigger is complete.
+        """
+        _debug('trigger_single()')
 
-            d.insert_header('xzero'+c,       0)#-float(self.query(':WAV:XOR? CHAN'+c)))
-            d.insert_header('xmultiplier'+c, xinc*xrescale)
-            d.insert_header('yzero'+c,       -float(self.query(':WAV:YOR? CHAN'+c)))
-            d.insert_header('ymultiplier'+c, yinc)
+        if self._command_trigger_single: self.write(self._command_trigger_single)
 
+        _debug('trigger_single() complete')
 
 
-        elif self.model in ['RIGOLZ']:
-            _debug('  RIGOLZ')
+    def get_header(self, d=None):
+        """
+        Updates the header of databox d to include xoffset, xmultiplier, xzero, yoffset,
+        ymultiplier, yzero. If d=None, creates a databox.
+        """
+        _debug('get_header()', d)
 
-            # Convert the yoffset to the Tek format
-            xinc = float(self.query(':WAV:XINC?'))
-            yinc = float(self.query(':WAV:YINC?'))
+        if d==None: d = _s.data.databox()
 
-            d.insert_header('xzero'+c,       0)#-float(self.query(':WAV:XOR?')))
-            d.insert_header('xmultiplier'+c, xinc)
-            d.insert_header('yzero'+c,       -float(self.query(':WAV:YOR?'))*yinc)
-            d.insert_header('ymultiplier'+c, yinc)
+        # For easier coding later
+        c = str(self._channel)
 
-        else:
-            print('ERROR: get_header() unhandled model '+str(self.model))
+        if self._get_header_model: self._get_header_model(d, c)
+        else: print('ERROR: get_header() unhandled model '+str(self.model))
 
         _debug('  Done with model-specifics.')
 
@@ -388,120 +513,209 @@ class sillyscope_api(_visa_tools.visa_api_base):
 
         return d
 
-
-    def _query_and_decode_waveform(self):
+    def _get_header_tektronix(self, d, c):
         """
-        Queries and then parses the waveform, returning the array of (int8)
-        voltages. Prior to calling this, make sure the scope is ready to
-        transfer and you've run self.set_channel().
+        TEKTRONIX part of get_header() for channel string c.
         """
-        _debug('_query_and_decode_waveform()')
+        _debug('  TEKTRONIX')
 
-        empty = _n.array([], dtype=_n.float16)
-
-        if self.model in ['TEKTRONIX']:
+        yinc = float(self.query('WFMP:YMUL?'))
 
-            # May be an option to change later
-            width = 1
-
-            if "MDO" in self.idn:
-                # Get number of points in waveform data
-                query = self.query("WFMOutpre:WFID?")
-                # Returned query looks something like
-                #"Ch2, DC coupling, 2.000V/div, 400.0us/div, 10000000 points, Sample mode"
-                # but header/verbose settings can change length, so look for entry ending with 'points'
-                # and extract number from that.
-                n_pts = int([str for str in query.split(', ') if 'points' in str][0].split(' ')[0])
-                # Set number of points to acquire to be the full waveform
-                self.write('DATA:STAR 1')
-                self.write('DATA:STOP %d' % n_pts)
-
-            # Ask for the waveform and read the response
-            try:
-                # Get the curve raw data
-                self.write('CURV?')
-                s = self.read_raw()
-
-            except:
-                print('ERROR: Timeout getting curve.')
-                return empty
+        d.insert_header('xzero'+c,       0)#float(self.query('WFMP:XZE?')))
+        d.insert_header('xmultiplier'+c, float(self.query('WFMP:XIN?')))
+        d.insert_header('yzero'+c,       -float(self.query('WFMP:YOF?'))*yinc)
+        d.insert_header('ymultiplier'+c, yinc)
 
-            # Get the length of the thing specifying the data length :)
-            n = int(s[1:3].decode()[0])
+    def _get_header_rigolde(self, d, c):
+        """
+        RIGOLDE part of get_header() for channel string c.
+        """
+        _debug('  RIGOLDE')
 
-            # Get the length of the data set
-            N = int(int(s[2:2+n].decode())/width)
+        # Get the increments (empirically determined f***ing manual)
+        xinc = float(self.query(':TIM:SCAL?'))       * 0.02
+        yinc = float(self.query(':CHAN'+c+':SCAL?')) * 0.04
 
-            # Convert to an array of integers
-            return _n.float16(_n.frombuffer(s[2+n:2+n+N*width],_n.int8))
+        d.insert_header('xzero'+c,       0)#float(self.query(':TIM:OFFS?')))
+        d.insert_header('xmultiplier'+c, xinc)
+        d.insert_header('yzero'+c,       -float(self.query(':CHAN'+c+':OFFS?')))
+        d.insert_header('ymultiplier'+c, yinc)
 
+    def _get_header_rigolb(self, d, c):
+        """
+        RIGOLB part of get_header() for channel string c.
+        """
+        _debug('  RIGOLB')
 
-        elif self.model in ['RIGOLDE']:
-            # Ask for the data
-            try:
-                self.write(':WAV:DATA? CHAN%d' % self._channel)
-                s = self.read_raw()
+        # Convert the yoffset to the Tek format
+        xinc = float(self.query(':WAV:XINC? CHAN'+c))
+        yinc = float(self.query(':WAV:YINC? CHAN'+c))
 
-            except:
-                print('ERROR: Timeout getting curve.')
-                return empty
+        # Also get whether we're in peak detect mode, since this messes up the x-scale!
+        d.insert_header('peak_detect', self.query(':ACQ:TYPE?').strip() == 'PEAK')
+        if d.h('peak_detect'): xrescale=0.5
+        else:                  xrescale=1.0
 
-            # Get the number of characters describing the number of points
-            n = int(s[1:2].decode())
+        d.insert_header('xzero'+c,       0)#-float(self.query(':WAV:XOR? CHAN'+c)))
+        d.insert_header('xmultiplier'+c, xinc*xrescale)
+        d.insert_header('yzero'+c,       -float(self.query(':WAV:YOR? CHAN'+c)))
+        d.insert_header('ymultiplier'+c, yinc)
 
-            # Get the number of points
-            N = int(s[2:2+n].decode())
-            _debug(N)
+    def _get_header_rigolz(self, d, c):
+        """
+        RIGOLZ part of get_header() for channel string c.
+        """
+        _debug('  RIGOLZ')
 
-            # Determined from measured results
-            return 125 - _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8))
+        # Convert the yoffset to the Tek format
+        xinc = float(self.query(':WAV:XINC?'))
+        yinc = float(self.query(':WAV:YINC?'))
 
+        d.insert_header('xzero'+c,       0)#-float(self.query(':WAV:XOR?')))
+        d.insert_header('xmultiplier'+c, xinc)
+        d.insert_header('yzero'+c,       -float(self.query(':WAV:YOR?'))*yinc)
+        d.insert_header('ymultiplier'+c, yinc)
 
-        elif self.model in ['RIGOLB']:
 
-            # Ask for the data
-            try:
-                self.write(':WAV:DATA?')
-                s = self.read_raw()
+    def _query_and_decode_waveform(self):
+        """
+        Queries and then parses the waveform, returning the array of (int8)
+        voltages. Prior to calling this, make sure the scope is ready to
+        transfer and you've run self.set_channel().
+        """
+        _debug('_query_and_decode_waveform()')
 
-            except:
-                print('ERROR: Timeout getting curve.')
-                return empty
+        empty = _n.array([], dtype=_n.float16)
 
-            # Get the number of characters describing the number of points
-            n = int(s[1:2].decode())
+        if self.model == 'TEKTRONIX' and "MDO" in self.idn:
+            # Get number of points in waveform data
+            query = self.query("WFMOutpre:WFID?")
+            # Returned query looks something like
+            #"Ch2, DC coupling, 2.000V/div, 400.0us/div, 10000000 points, Sample mode"
+            # but header/verbose settings can change length, so look for entry ending with 'points'
+            # and extract number from that.
+            n_pts = int([str for str in query.split(', ') if 'points' in str][0].split(' ')[0])
+            # Set number of points to acquire to be the full waveform
+            self.write('DATA:STAR 1')
+            self.write('DATA:STOP %d' % n_pts)
+
+        # Unhandled model
+        if not self._command_waveform: return empty
+
+        # Ask for the waveform and read the response
+        try:
+            if '%d' in self._command_waveform: self.write(self._command_waveform % self._channel)
+            else:                              self.write(self._command_waveform)
+            s = self.read_raw()
+
+        except:
+            print('ERROR: Timeout getting curve.')
+            return empty
+
+        return self._decode_waveform(s)
+
+    def _query_and_decode_waveforms(self, channels):
+        """
+        Requests the waveforms of all the specified channels with a single
+        compound command, then reads and parses the binary blocks in order,
+        returning a list of arrays of (int8) voltages. Afterward, the source
+        channel is the last one in the list.
+        """
+        _debug('_query_and_decode_waveforms()', channels)
 
-            # Get the number of points
-            N = int(s[2:2+n].decode())
-            _debug(N)
+        # Assemble the (model-specific) commands for each channel
+        self.write(';'.join([self._command_waveforms % c for c in channels]))
 
-            # Convert it to integers, this code is based on empirically measuring.
-            return 99 - _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8))
+        # The scope has now switched to the last channel
+        self._channel = channels[-1]
+        self._channel_written = True
 
+        # Read back the blocks and decode them
+        return [self._decode_waveform(s, i) for s, i in self._read_blocks(len(channels))]
 
-        elif self.model in ['RIGOLZ']:
+    def _read_blocks(self, count):
+        """
+        Reads the specified number of binary blocks '#<n><N><N bytes>' from
+        the instrument, returning a list of (buffer, index) pairs, where index
+        is the location of the block's '#' in buffer (so the payload does not
+        need to be copied out of the buffer). Responses to a compound
+        query may arrive in one message (separated by ';') or in several, so
+        this keeps reading until it has them all.
+        """
+        blocks = []
+        s = b''
+        i = 0 # Start of the unparsed data
+        while len(blocks) < count:
+
+            # Find the start of the next block and its length, if we have it
+            j = s.find(b'#', i)
+            if j >= 0 and len(s) >= j+2:
+                n = int(s[j+1:j+2].decode())
+                if len(s) >= j+2+n:
+                    N = int(s[j+2:j+2+n].decode())
+
+                    # If the whole thing is here, keep it and move on
+                    if len(s) >= j+2+n+N:
+                        blocks.append((s, j))
+                        i = j+2+n+N
+                        continue
+
+            # Otherwise we need more data
+            s = s[i:] + self.read_raw()
+            i = 0
+
+        return blocks
+
+    def _decode_waveform(self, s, i=0):
+        """
+        Parses a binary block '#<n><N><N bytes>' starting at index i of the
+        bytes s returned by the scope, returning the array of (int8) voltages.
+        """
+        # Get the number of characters describing the number of points
+        n = int(s[i+1:i+2].decode())
 
-            # Ask for the data
-            try:
-                self.write(':WAV:DATA?')
-                s = self.read_raw()
+        # Get the number of points
+        N = int(s[i+2:i+2+n].decode())
+        _debug(N)
 
-            except:
-                print('ERROR: Timeout getting curve.')
-                return empty
+        # Decode straight from the buffer (no slice copy of the payload),
+        # keeping only what actually arrived if the block is truncated.
+        offset = min(i+2+n, len(s))
+        return self._decode_waveform_model(s, offset, max(min(N, len(s)-offset), 0))
 
-            # Get the number of characters describing the number of points
-            n = int(s[1:2].decode())
+    def _decode_waveform_tektronix(self, s, offset, N):
+        """
+        Converts the N TEKTRONIX waveform bytes starting at offset in s to (int8)
+        voltages.
+        """
+        # Convert to an array of integers (DATA:WIDTH 1 means one byte per point)
+        return _n.float16(_n.frombuffer(s, _n.int8, N, offset))
 
-            # Get the number of points
-            N = int(s[2:2+n].decode())
-            _debug(N)
+    def _decode_waveform_rigolde(self, s, offset, N):
+        """
+        Converts the N RIGOLDE waveform bytes starting at offset in s to (int8)
+        voltages.
+        """
+        # Determined from measured results
+        return 125 - _n.float16(_n.frombuffer(s, _n.uint8, N, offset))
 
-            # Convert it to an array of integers.
-            # This hits the rails properly on the DS1074Z, but is one step off from
-            # The values reported on the main screen.
-            return _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8)) - 127
+    def _decode_waveform_rigolb(self, s, offset, N):
+        """
+        Converts the N RIGOLB waveform bytes starting at offset in s to (int8)
+        voltages.
+        """
+        # Convert it to integers, this code is based on empirically measuring.
+        return 99 - _n.float16(_n.frombuffer(s, _n.uint8, N, offset))
 
+    def _decode_waveform_rigolz(self, s, offset, N):
+        """
+        Converts the N RIGOLZ waveform bytes starting at offset in s to (int8)
+        voltages.
+        """
+        # Convert it to an array of integers.
+        # This hits the rails properly on the DS1074Z, but is one step off from
+        # The values reported on the main screen.
+        return _n.float16(_n.frombuffer(s, _n.uint8, N, offset)) - 127
 
     def set_binary_encoding(self):
         """
@@ -509,38 +723,37 @@ class sillyscope_api(_visa_tools.visa_api_base):
         """
         _debug('set_binary_encoding()')
 
+        # Each is sent as one compound command to save round trips.
         if self.model in ['TEKTRONIX']:
-            self.write('DATA:ENC SRI')
-            self.write('DATA:WIDTH 1') # Use 2 for two bytes per point.
+            self.write('DATA:ENC SRI;:DATA:WIDTH 1') # Use WIDTH 2 for two bytes per point.
 
         elif self.model in ['RIGOLDE']:
             self.write(':WAV:POIN:MODE NORM')
 
         elif self.model in ['RIGOLZ', 'RIGOLB']:
-            self.write(':WAV:MODE NORM') # Just get the screen. Use RAW to access the full memory.
-            self.write(':WAV:FORM BYTE') # Use WORD to have two bytes per point.
+            # MODE NORM just gets the screen. Use RAW to access the full memory.
+            # FORM BYTE is one byte per point. Use WORD to have two.
+            self.write(':WAV:MODE NORM;:WAV:FORM BYTE')
 
         else:
-            _debug('  ERROR: unhandled scope model '+str(self.model))
+            _debug('  ERROR: unhandled scope model', self.model)
 
-    def set_channel(self, channel=1):
+    def set_channel(self, channel=1, force=False):
         """
-        Select the channel to get the waveform data.
+        Select the channel to get the waveform data. If this channel was
+        already selected by a previous call, nothing is sent unless force=True.
         """
         _debug('set_channel()')
 
-        if self.model == 'TEKTRONIX':
-            self.write('DATA:SOURCE CH%d' % channel)
-
-        elif self.model in ['RIGOLDE']:
-            # DE Relies on a channel specified with the data query
-            pass
+        # Already selected; skip the round trip.
+        if channel == self._channel and self._channel_written and not force: return
 
-        elif self.model in ['RIGOLB', 'RIGOLZ']:
-            self.write(':WAV:SOUR CHAN%d' % channel)
+        if self._command_set_channel:
+            self.write(self._command_set_channel % channel)
+            self._channel_written = True
 
-        else:
-            _debug('  ERROR: unhandled scope model '+str(self.model))
+        elif not self.model in self._commands_set_channel:
+            _debug('  ERROR: unhandled scope model', self.model)
 
         # Keep this for future use.
         self._channel = channel
@@ -553,12 +766,10 @@ class sillyscope_api(_visa_tools.visa_api_base):
         _debug('set_mode_single_trigger()', self.model)
 
         if self.model == 'TEKTRONIX':
-            self.write('ACQ:STATE STOP')
-            self.write('ACQ:STOPA SEQ')
+            self.write('ACQ:STATE STOP;:ACQ:STOPA SEQ')
 
         elif self.model in ['RIGOLZ', 'RIGOLDE', 'RIGOLB']:
-            self.write(':STOP')
-            self.write(':TRIG:EDGE:SWE SINGLE')
+            self.write(':STOP;:TRIG:EDGE:SWE SINGLE')
 
 
 
@@ -593,10 +804,20 @@ class sillyscope(_visa_tools.visa_gui_base):
         # Build the GUI
         self.window.event_close = self._event_close
 
+        # Processes pending GUI events during acquisition (cheaply)
+        self._process_events = _gt.event_pump()
+
         self.button_1         = self.grid_top.place_object(_g.Button('1',True).set_width(25).set_checked(True))
         self.button_2         = self.grid_top.place_object(_g.Button('2',True).set_width(25))
         self.button_3         = self.grid_top.place_object(_g.Button('3',True).set_width(25))
         self.button_4         = self.grid_top.place_object(_g.Button('4',True).set_width(25))
+
+        # Channel table: (button, channel number, column key)
+        self._channel_table = [(self.button_1, 1, 'y1'),
+                               (self.button_2, 2, 'y2'),
+                               (self.button_3, 3, 'y3'),
+                               (self.button_4, 4, 'y4')]
+        self._ykeys = dict([(c, k) for b, c, k in self._channel_table])
         self.button_acquire   = self.grid_top.place_object(_g.Button('Acquire',True).disable())
         self.number_count     = self.grid_top.place_object(_g.NumberBox(0).disable())
         self.button_onair   = self.grid_top.place_object(_g.Button('Waiting', True).set_width(70))
@@ -606,8 +827,14 @@ class sillyscope(_visa_tools.visa_gui_base):
         self.tab_raw   = self.tabs_data.add_tab('Raw')
         self.plot_raw  = self.tab_raw.place_object(_g.DataboxPlot('*.txt', name+'_plot_raw.txt'), alignment=0)
 
-        # Keep track of previous plot
-        self._previous_data = _s.data.databox()
+        # Keep track of previous plot's columns
+        self._previous_data = dict()
+
+        # Background transfer in progress (channels, future), if any
+        self._prefetch = None
+
+        # Scope model, remembered on connect
+        self._model = None
 
         # Settings format
         self.settings.set_width(240)
@@ -618,23 +845,30 @@ class sillyscope(_visa_tools.visa_gui_base):
         self.settings.add_parameter('Acquire/Get_First_Header', True,  tip='Get the header (calibration) information the first time. Disabling this will return uncalibrated data.')
         self.settings.add_parameter('Acquire/Get_All_Headers',  True,  tip='Get the header (calibration) information EVERY time. Disabling this will use the first header repeatedly.')
         self.settings.add_parameter('Acquire/Discard_Identical',False, tip='Do not continue until the data is different.')
+        self.settings.add_parameter('Acquire/Prefetch',         False, tip='When not triggering (and not using a RIGOL Z), transfer the next waveforms in the background while plotting and processing the current ones.')
 
         # Device-specific settings
         self.settings.add_parameter('Acquire/RIGOL1000BDE/Trigger_Delay', 0.05, bounds=(1e-3,10), siPrefix=True, suffix='s', dec=True, tip='How long after "trigger" command to wait before checking status. Some scopes appear to be done for a moment between the trigger command and arming.')
         self.settings.add_parameter('Acquire/RIGOL1000BDE/Unlock',        True, tip='Unlock the device\'s frong panel after acquisition.')
         self.settings.add_parameter('Acquire/RIGOL1000Z/Always_Clear',    True, tip='Clear the scope prior to acquisition even in untriggered mode (prevents duplicates but may slow acquisition).')
 
+        # Single-shot timer driving the acquisition; _acquire_step() re-arms it
+        # after each acquisition, so the window stays responsive between them.
+        self.timer_acquire = _g.Timer(interval_ms=0, single_shot=True)
+        self.timer_acquire.signal_tick.connect(self._acquire_step)
+        self._acquiring    = False # Between starting and cleaning up
+        self._acquire_busy = False # In the middle of _acquire_step()
+
         # Connect all the signals
         self.settings.connect_signal_changed('Acquire/Trigger', self._settings_trigger_changed)
+        self.settings.connect_any_signal_changed(self._cache_acquire_settings)
         self.button_acquire.signal_toggled.connect(self._button_acquire_clicked)
-        self.button_1.signal_toggled.connect(self.save_gui_settings)
-        self.button_2.signal_toggled.connect(self.save_gui_settings)
-        self.button_3.signal_toggled.connect(self.save_gui_settings)
-        self.button_4.signal_toggled.connect(self.save_gui_settings)
+        for b, c, k in self._channel_table: b.signal_toggled.connect(self.save_gui_settings)
 
         # Run the base object stuff and autoload settings
         self._autosettings_controls = ['self.button_1', 'self.button_2', 'self.button_3', 'self.button_4']
         self.load_gui_settings()
+        self._cache_acquire_settings()
 
         # Add additional analysis tabs
         self.tab_A1 = self.tabs_data.add_tab('A1')
@@ -693,6 +927,7 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         Called after a successful connection.
         """
+        self._model = self.api.model
         self.button_acquire.enable()
 
     def _after_disconnect(self):
@@ -701,11 +936,30 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         self.button_acquire.disable()
 
+    def _cache_acquire_settings(self, *a):
+        """
+        Copies the settings used by the acquisition loop into the dictionary
+        self._acquire, so the loop doesn't have to walk the settings tree
+        every iteration. Called whenever a setting changes.
+        """
+        self._acquire = dict()
+        for k in ['Acquire/Iterations',
+                  'Acquire/Trigger',
+                  'Acquire/Get_First_Header',
+                  'Acquire/Get_All_Headers',
+                  'Acquire/Discard_Identical',
+                  'Acquire/Prefetch',
+                  'Acquire/RIGOL1000BDE/Trigger_Delay',
+                  'Acquire/RIGOL1000Z/Always_Clear']:
+            self._acquire[k] = self.settings[k]
+
     def _settings_trigger_changed(self, *a):
         """
         Called when someone clicks the Trigger checkbox.
         """
         if self.settings['Acquire/Trigger']:
+            # Let any (now unwanted) background transfer finish first
+            self._finish_prefetch()
             self.api.set_mode_single_trigger()
             self.unlock()
 
@@ -730,11 +984,11 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         _debug('acquisition_is_finished()')
 
-        if self.api.model == 'TEKTRONIX':
+        if self._model == 'TEKTRONIX':
             _debug('  TEK')
             return not bool(int(self.api.query('ACQ:STATE?')))
 
-        elif self.api.model == 'RIGOLZ':
+        elif self._model == 'RIGOLZ':
             _debug('  RIGOLZ')
 
             # If the waveforms are empty (we cleared it!)
@@ -742,100 +996,141 @@ class sillyscope(_visa_tools.visa_gui_base):
             if len(self.plot_raw[0]) > 0: return True
             else:                         return False
 
-        elif self.api.model in ['RIGOLDE', 'RIGOLB']:
+        elif self._model in ['RIGOLDE', 'RIGOLB']:
             _debug('  RIGOLDE/B')
 
-            self.window.sleep(self.settings['Acquire/RIGOL1000BDE/Trigger_Delay'])
+            self.window.sleep(self._acquire['Acquire/RIGOL1000BDE/Trigger_Delay'])
             s = self.api.query(':TRIG:STAT?').strip()
             return s == 'STOP'
 
+    def _wait_for_acquisition(self, delay=0.001, delay_max=0.02):
+        """
+        Polls acquisition_is_finished() until it returns True or the user
+        unchecks the acquire button. The sleep between polls starts at delay
+        and grows by 50% each time up to delay_max (sec), so short acquisitions
+        return quickly and long ones don't hammer the scope with queries.
+        """
+        while not self.acquisition_is_finished() and self.button_acquire.is_checked():
+            self.window.sleep(delay)
+            delay = min(delay*1.5, delay_max)
+
     def get_waveforms(self, plot=True):
         """
         Queries all the waveforms that are enabled, overwriting self.plot_raw
         """
         _debug('get_waveforms()')
 
-
-        # Find out if we should get the header
-        get_header = self.settings['Acquire/Get_All_Headers']  \
-                  or self.settings['Acquire/Get_First_Header'] \
-                 and self.number_count.get_value() == 0
-
         # Tell the user we're getting data
         self.button_transfer.set_checked(True)
-        self.window.process_events()
+        self._process_events()
 
-        # If we're not getting data.
-        if not self.button_1.get_value() and \
-           not self.button_2.get_value() and \
-           not self.button_3.get_value() and \
-           not self.button_4.get_value():
-               self.button_transfer.set_checked(False)
-               return
+        # Find out which channels we're supposed to get
+        channels = self._get_enabled_channels()
 
+        # If we're not getting data.
+        if not len(channels):
+            self.button_transfer.set_checked(False)
+            return
 
-        # Clear the raw plot
-        self.plot_raw.clear()
+        # Actually get them (all in one go if the scope supports it).
+        ds = self.api.get_waveforms(channels, use_previous_header=not self._get_header_needed())
 
-        # If we're supposed to get curve 1
-        if self.button_1.get_value():
+        # Update the main plot
+        self._show_waveforms(channels, ds)
+        self._process_events()
 
-            # Actually get it.
-            d = self.api.get_waveform(1, use_previous_header=not get_header)
+        # Tell the user we're done transferring data
+        self.button_transfer.set_checked(False)
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y1'] = d['y1']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
+        # Plot.
+        if plot:
+            self.plot_raw.plot()
+            self.plot_raw.autosave()
+            self._process_events()
 
-        # If we're supposed to get curve 2
-        if self.button_2.get_value():
+        _debug('get_waveforms() complete')
 
-            # Actually get it
-            d = self.api.get_waveform(2, use_previous_header=not get_header)
+    def _get_enabled_channels(self):
+        """
+        Returns a list of the enabled channel numbers.
+        """
+        return [c for b, c, k in self._channel_table if b.get_value()]
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y2'] = d['y2']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
+    def _get_header_needed(self):
+        """
+        Returns True if we should get the header on this transfer.
+        """
+        return self._acquire['Acquire/Get_All_Headers']  \
+            or self._acquire['Acquire/Get_First_Header'] \
+           and self.number_count.get_value() == 0
 
-        # If we're supposed to get curve 2
-        if self.button_3.get_value():
+    def _show_waveforms(self, channels, ds):
+        """
+        Fills self.plot_raw with the list of databoxes ds returned by
+        self.api.get_waveforms(channels). The columns are only cleared and
+        recreated when the channels change. Every transfer makes new arrays,
+        so they are installed directly rather than copied again. The headers
+        are always replaced.
+        """
+        p     = self.plot_raw
+        ykeys = [self._ykeys[c] for c in channels]
+
+        # Clear the raw plot only if the columns are changing. Otherwise just
+        # clear the headers left over from the previous transfer.
+        if p.ckeys == ['x']+ykeys: p.clear_headers()
+        else:                      p.clear()
+
+        # Update the main plot (directly, since p['x'] = ... would copy),
+        # merging the headers so the shared keys (timing, duty cycle, ...)
+        # are only inserted once.
+        headers = dict()
+        p.columns['x'] = ds[-1]['x']
+        for n in range(len(channels)):
+            p.columns[ykeys[n]] = ds[n][ykeys[n]]
+            headers.update(ds[n].headers)
+        p.ckeys = ['x']+ykeys
+        p.update_headers(headers)
+
+    def _start_prefetch(self):
+        """
+        Starts transferring the enabled waveforms in a background thread.
+        """
+        channels = self._get_enabled_channels()
+        self._prefetch = channels, self.api.get_waveforms_async(channels, use_previous_header=not self._get_header_needed())
 
-            # Actually get it
-            d = self.api.get_waveform(3, use_previous_header=not get_header)
+    def _finish_prefetch(self):
+        """
+        Waits for any background transfer to finish (keeping the GUI alive),
+        returning (channels, databoxes), or None if there was no transfer.
+        """
+        if self._prefetch == None: return
+        channels, future = self._prefetch
+        while not future.done(): self.window.sleep(0.001)
+        self._prefetch = None
+        return channels, future.result()
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y3'] = d['y3']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
+    def _get_prefetched_waveforms(self):
+        """
+        Stuffs the waveforms from the background transfer (starting one if
+        necessary) into self.plot_raw. _acquire_and_plot() starts the next
+        transfer once these are counted, so it runs while we plot and process
+        them.
+        """
+        _debug('_get_prefetched_waveforms()')
 
-        # If we're supposed to get curve 2
-        if self.button_4.get_value():
+        # Tell the user we're getting data
+        self.button_transfer.set_checked(True)
 
-            # Actually get it
-            d = self.api.get_waveform(4, use_previous_header=not get_header)
+        # Get the current transfer
+        if self._prefetch == None: self._start_prefetch()
+        channels, ds = self._finish_prefetch()
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y4'] = d['y4']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
+        # Update the main plot
+        if len(channels): self._show_waveforms(channels, ds)
 
         # Tell the user we're done transferring data
         self.button_transfer.set_checked(False)
 
-        # Plot.
-        if plot:
-            self.plot_raw.plot()
-            self.plot_raw.autosave()
-            self.window.process_events()
-
-        _debug('get_waveforms() complete')
-
     def unlock(self):
         """
         If we're using a RIGOLDE/B and wish to unlock, send the :FORC command.
@@ -867,12 +1162,19 @@ class sillyscope(_visa_tools.visa_gui_base):
         # Update the user
         self.button_onair.set_checked(True)
 
-        # Transfer the current data to the previous
-        self._previous_data.clear()
-        self._previous_data.copy_all(self.plot_raw)
+        # Remember the current data as the previous. Each transfer puts new
+        # arrays into self.plot_raw, so references are enough (no copying).
+        self._previous_data = _column_references(self.plot_raw)
+
+        # Whether to overlap the transfers with the plotting. If not, make
+        # sure no background transfer is still talking to the scope.
+        prefetch = self._acquire['Acquire/Prefetch']     \
+               and not self._acquire['Acquire/Trigger'] \
+               and not self._model in ['RIGOLZ']
+        if not prefetch: self._finish_prefetch()
 
         # Trigger
-        if self.settings['Acquire/Trigger']:
+        if self._acquire['Acquire/Trigger']:
 
             _debug('  TRIGGERING')
 
@@ -884,9 +1186,7 @@ class sillyscope(_visa_tools.visa_gui_base):
             if self.api.instrument == None: self.window.sleep(self.api._simulation_sleep)
 
             # Actual scope: wait for it to finish
-            else:
-                while not self.acquisition_is_finished() and self.button_acquire.is_checked():
-                    self.window.sleep(0.02)
+            else: self._wait_for_acquisition(0.001, 0.02)
 
             # Tell the user it's done acquiring.
             _debug('  TRIGGERING DONE')
@@ -895,15 +1195,14 @@ class sillyscope(_visa_tools.visa_gui_base):
         # is to clear it and keep asking for the waveform.
 
         # Not triggering but RIGOLZ mode: clear the data first and then wait for data
-        elif self.api.model in ['RIGOLZ']:
+        elif self._model in ['RIGOLZ']:
 
             # Clear the scope if we're not in free running mode
-            if self.settings['Acquire/RIGOL1000Z/Always_Clear']:
+            if self._acquire['Acquire/RIGOL1000Z/Always_Clear']:
                 self.api.write(':CLE')
 
             # Wait for it to complete
-            while not self.acquisition_is_finished() and self.button_acquire.is_checked():
-                self.window.sleep(0.005)
+            self._wait_for_acquisition(0.001, 0.005)
 
         self.button_onair.set_checked(False)
 
@@ -916,12 +1215,14 @@ class sillyscope(_visa_tools.visa_gui_base):
             # after clearing the scope and seeing if there is data returned.
 
             # Triggered RIGOLZ scopes already have the data
-            if self.api.model in [None, 'TEKTRONIX', 'RIGOLDE', 'RIGOLB'] or \
-               not self.settings['Acquire/Trigger']:
+            if self._model in [None, 'TEKTRONIX', 'RIGOLDE', 'RIGOLB'] or \
+               not self._acquire['Acquire/Trigger']:
 
-                   # Query the scope for the data and stuff it into the plotter
-                   self.get_waveforms(plot=False)
-                   _debug('  got '+str(self.plot_raw))
+                   # Query the scope for the data and stuff it into the plotter,
+                   # overlapping the transfer with the plotting if we can.
+                   if prefetch: self._get_prefetched_waveforms()
+                   else:        self.get_waveforms(plot=False)
+                   _debug('  got', self.plot_raw)
 
             _debug('  processing')
 
@@ -930,11 +1231,17 @@ class sillyscope(_visa_tools.visa_gui_base):
 
             # Decrement if it's identical to the previous trace
             is_identical=False
-            if self.settings['Acquire/Discard_Identical']:
-                is_identical = self.plot_raw.is_same_as(self._previous_data, headers=False)
+            if self._acquire['Acquire/Discard_Identical']:
+                is_identical = _columns_equal(_column_references(self.plot_raw), self._previous_data)
                 _debug('  Is identical to previous?', is_identical)
                 if is_identical: self.number_count.increment(-1)
 
+            # Start the next background transfer (if there is a next one)
+            # now that the count is final, so it knows whether it needs the header.
+            N = self._acquire['Acquire/Iterations']
+            if prefetch and (self.number_count.get_value() < N or N <= 0):
+                self._start_prefetch()
+
             # Transfer all the header info
             self.settings.send_to_databox_header(self.plot_raw)
 
@@ -944,14 +1251,13 @@ class sillyscope(_visa_tools.visa_gui_base):
             if not is_identical: self.plot_raw.autosave()
 
             _debug('  plotting done')
-            self.window.process_events()
+            self._process_events()
 
             # External analysis
             self.process_data()
 
             # End condition
             _debug('  checking end condition')
-            N = self.settings['Acquire/Iterations']
             if self.number_count.get_value() >= N and not N <= 0:
                 self.button_acquire.set_checked(False)
 
@@ -959,20 +1265,33 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         Fixes up the GUI and scope after the acquisition loop.
         """
+        # Let any background transfer finish before talking to the scope
+        self._finish_prefetch()
+
         # Enable the connect button
         self.button_connect.enable()
 
         # Unlock the RIGOL1000E front panel
         self.unlock()
 
+        # Done. Ignore any click while cleaning up, rather than leave the
+        # button checked with nothing running.
+        self._acquiring = False
+        self.button_acquire.set_checked(False, block_signals=True)
+
     def _button_acquire_clicked(self, *a):
         """
         Get the enabled curves, storing them in plot_raw.
+
+        This only starts the acquisition, which then runs from
+        self.timer_acquire, so it (and self.button_acquire.click()) returns
+        right away. Use wait_until_finished() to wait for it.
         """
         _debug('_button_acquire_clicked()')
 
-        # Don't double-loop!
-        if not self.button_acquire.is_checked(): return
+        # Don't double-loop! This includes re-checking the button before the
+        # loop noticed it was unchecked; it just keeps going.
+        if not self.button_acquire.is_checked() or self._acquiring: return
 
         # Don't proceed if we have no connection
         if self.api == None:
@@ -985,10 +1304,37 @@ class sillyscope(_visa_tools.visa_gui_base):
 
         _debug('  beginning loop')
 
+        # Start the event-driven loop; each tick is one acquisition.
+        self._acquiring = True
+        self.timer_acquire.start()
+
+    def _acquire_step(self, *a):
+        """
+        Called by self.timer_acquire: performs one acquisition and re-arms the
+        timer, or cleans up once the acquire button is unchecked.
+        """
+        # Still in the previous step (which processes events, and will re-arm
+        # the timer when it's done)
+        if self._acquire_busy: return
+
         # Continue until unchecked
-        while self.button_acquire.is_checked(): 
-            self._acquire_and_plot()
-            self.after_acquire_iteration()
+        if self.button_acquire.is_checked():
+            self._acquire_busy = True
+            try:
+                self._acquire_and_plot()
+                self.after_acquire_iteration() # Looked up each time in case it's overwritten
+
+            # Don't leave the GUI locked on an error
+            except:
+                self.button_acquire.set_checked(False, block_signals=True)
+                self._post_acquisition()
+                raise
+
+            finally: self._acquire_busy = False
+
+            # Next acquisition (or clean up if that was the last one)
+            self.timer_acquire.start()
+            return
 
         _debug('  loop done')
 
@@ -996,6 +1342,14 @@ class sillyscope(_visa_tools.visa_gui_base):
         self._post_acquisition()
         self.after_acquire_finished()
 
+    def wait_until_finished(self):
+        """
+        Processes events until the acquisition (started with the acquire
+        button) is finished and cleaned up. For example, in a script,
+        self.button_acquire.click(); self.wait_until_finished()
+        """
+        while self._acquiring: self.window.sleep(0.001, 0.001)
+
     def after_acquire_iteration(self):
         """
         Dummy function you can overwrite. Called after each acquisition iteration.
@@ -95,7 +95,7 @@ class visa_api_base():
         """
         Shortcut for coding. Runs a query() if there is a question mark, and a write() if there is not.
         """
-        _debug('api_base.command('+message+')')
+        _debug('api_base.command()', message)
 
         if message.find('?') >= 0: return self.query(message)
         else:                      return self.write(message)
@@ -104,7 +104,7 @@ class visa_api_base():
         """
         Sends the supplied message and returns the response.
         """
-        _debug('api_base.query('+"'"+message+"'"+')')
+        _debug('api_base.query()', message)
 
         if self.instrument == None:
             _t.sleep(self._write_sleep)
@@ -117,7 +117,7 @@ class visa_api_base():
         """
         Writes the supplied message.
         """
-        _debug('api_base.write('+"'"+message+"'"+')')
+        _debug('api_base.write()', message)
 
         if self.instrument == None:
             _t.sleep(self._write_sleep)
@@ -137,7 +137,7 @@ class visa_api_base():
         if self.instrument == None: return
         else:
             s = self.instrument.read()
-            _debug('  '+str(s))
+            _debug('  read', s)
             return s
 
     def read_raw(self):
@@ -149,7 +149,7 @@ class visa_api_base():
         if self.instrument == None: return
         else:
             s = self.instrument.read_raw()
-            _debug('  '+ str(s))
+            _debug('  read_raw', s)
             return s
 
 
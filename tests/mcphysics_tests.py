@@ -74,6 +74,165 @@ class errthing(_ut.TestCase):
         _s.plot.xy.function(['em_gaussian(x,1,2)', 'voigt(x,2,1)', 'erfcx(x)', 'reduced_chi2(x,10)'],
                              1e-6,5,1000,g=_m.functions.__dict__)
 
+    def test_adalm2000_cycles_samples(self):
+        f = _m.instruments._adalm2000._get_cycles_samples
+
+        # Every option is a whole number of cycles; first one wins
+        self.assertEqual(f(100.0, 200, 1000), 200)
+
+        # Nearest to a whole number of cycles (5 x 33.4 = 167)
+        self.assertEqual(f(33.4, 50, 200), 167)
+
+        # Only one option
+        self.assertEqual(f(150.0, 100, 200), 150)
+
+        # Not even one cycle fits: stay within the maximum
+        self.assertEqual(f(300.0, 200, 250), 250)
+
+    def test_adalm2000_get_samples(self):
+
+        # Stand-in for libm2k's M2kAnalogIn, returning the same types
+        class analog_in():
+            error = None
+            def getTrigger(self):          return None
+            def isChannelEnabled(self, n): return True
+            def stopAcquisition(self):     return
+            def getSamples(self, N):     # VectorVectorD
+                if self.error: raise self.error
+                return ((0.5,)*N, (-0.5,)*N)
+            def getSamplesRaw(self, N):  # VectorVectorD
+                return (tuple(range(N)), tuple(range(-N,0)))
+            def getSamplesInterleaved(self, N):    return object() # double const *
+            def getSamplesRawInterleaved(self, N): return object() # short const *
+
+        api = analog_in()
+        a   = _m.instruments._adalm2000._adalm2000_analog_in(api)
+
+        V1, V2 = a.get_samples(4)
+        self.assertEqual(V1.dtype, _n.float64)
+        self.assertEqual(V1.tolist(), [ 0.5]*4)
+        self.assertEqual(V2.tolist(), [-0.5]*4)
+
+        r1, r2 = a.get_samples_raw(3)
+        self.assertEqual(r1.dtype, _n.int16)
+        self.assertEqual(r1.tolist(), [0,1,2])
+        self.assertEqual(r2.tolist(), [-3,-2,-1])
+
+        # Timeouts give None, other errors are raised
+        api.error = RuntimeError('Timeout occurred')
+        self.assertIsNone(a.get_samples(4))
+        api.error = ValueError('Bad number of samples')
+        self.assertRaises(ValueError, a.get_samples, 4)
+
+    def test_gui_tools_nearest_frequency(self):
+        f = _m.instruments._gui_tools.get_nearest_frequency_settings
+
+        # Three cycles of 1 kHz fit exactly in 300 samples
+        self.assertEqual(f(1000.0, 1e5, 200, 8192, 4), (1000.0, 3, 300))
+        self.assertEqual(f(0,      1e5, 200, 8192, 4), (0.0, 1, 204))
+
+        # Repeated arguments come from the cache
+        hits = f.cache_info().hits
+        self.assertEqual(f(1000.0, 1e5, 200, 8192, 4), (1000.0, 3, 300))
+        self.assertEqual(f.cache_info().hits, hits+1)
+
+        # Arguments must be hashable
+        self.assertRaises(TypeError, f, [1000.0], 1e5)
+
+    def test_gui_tools_waveform_designer(self):
+        w = _m.instruments._gui_tools.waveform_designer(1000.0, name='test_waveform_designer').add_channel('Ch1')
+
+        # Generates Ch1's waveform for the supplied settings
+        def generate(waveform, N, **kwargs):
+            s = w.settings
+            s.set_value('Ch1/Waveform', waveform, block_all_signals=True)
+            s.set_value('Ch1/Samples',  N,        block_all_signals=True)
+            for k in kwargs: s.set_value('Ch1/'+waveform+'/'+k, kwargs[k], block_all_signals=True)
+            s.set_value('Ch1/'+waveform, 1000.0/N*kwargs['Cycles'], block_all_signals=True)
+            w._generate_waveform('Ch1')
+            return w.plot_design['Ch1']
+
+        # Sine, tiled over gcd(N,Cycles) = 2 repeats or calculated in full
+        k = _n.arange(1000)
+        for cycles in [6, 7]:
+            v = generate('Sine', 1000, Cycles=cycles, Amplitude=1.0, Offset=0.5, Phase=30.0)
+            self.assertTrue(_n.allclose(v, 0.5+_n.sin(2*_n.pi*cycles*k/1000+_n.pi/6)))
+
+        # Square with edges landing exactly on samples (high from 5 to 16
+        # of each 25-sample period, or from 10 to 33 of each 50)
+        k = _n.arange(100)
+        v = generate('Square', 100, Cycles=4, High=1.0, Low=-1.0, Start=0.2, Width=0.48)
+        self.assertEqual(v.tolist(), _n.where((k >= 5) & ((k-5)%25 < 12), 1.0, -1.0).tolist())
+        v = generate('Square', 100, Cycles=2, High=1.0, Low=-1.0, Start=0.2, Width=0.48)
+        self.assertEqual(v.tolist(), _n.where((k >= 10) & ((k-10)%50 < 24), 1.0, -1.0).tolist())
+
+    def test_gui_tools_ring_buffer(self):
+        r = _m.instruments._gui_tools.ring_buffer(2, 3)
+        self.assertEqual(r.size, 4) # Next power of two
+
+        # Wrap around one sample at a time
+        for n in range(6): r.append(n, -n)
+        self.assertEqual(len(r), 4)
+        self.assertEqual(r.get().tolist(), [[2,3,4,5], [-2,-3,-4,-5]])
+
+        # Wrap around in a block, and with more than fits
+        r.extend(_n.arange(6,9), -_n.arange(6,9))
+        self.assertEqual(r.get().tolist(), [[5,6,7,8], [-5,-6,-7,-8]])
+        r.extend(_n.arange(10,20), _n.arange(10,20))
+        self.assertEqual(r.get().tolist(), [[16,17,18,19], [16,17,18,19]])
+
+        # Start over
+        r.clear()
+        self.assertEqual(r.get().shape, (2,0))
+        r.append(1, 2)
+        self.assertEqual(r.get().tolist(), [[1], [2]])
+
+    def test_sillyscope_decode_waveform(self):
+        a = _m.instruments.sillyscope_api(simulation=True)
+        a._decode_waveform_model = a._decode_waveform_tektronix
+
+        self.assertEqual(list(a._decode_waveform(b'#13\x01\x02\xff\n')), [1,2,-1])
+
+        # Block partway into the buffer
+        self.assertEqual(list(a._decode_waveform(b'xx#12\x03\x04', 2)), [3,4])
+
+        # Truncated blocks keep what arrived
+        self.assertEqual(list(a._decode_waveform(b'#15\x01\x02')), [1,2])
+        self.assertEqual(len (a._decode_waveform(b'#15')), 0)
+
+    def test_sillyscope_read_blocks(self):
+        a = _m.instruments.sillyscope_api(simulation=True)
+        a._decode_waveform_model = a._decode_waveform_tektronix
+
+        # Fake instrument messages
+        def read_blocks(messages, count):
+            messages = list(messages)
+            a.read_raw = lambda: messages.pop(0)
+            return [list(a._decode_waveform(s, i)) for s, i in a._read_blocks(count)]
+
+        # Two blocks in one message
+        self.assertEqual(read_blocks([b'#12\x01\x02;#13\x03\x04\x05\n'], 2), [[1,2],[3,4,5]])
+
+        # Blocks split across messages, including within the headers
+        self.assertEqual(read_blocks([b'#', b'13\x01', b'\x02\x03;#2', b'02\x04\x05\n'], 2), [[1,2,3],[4,5]])
+
+        # Only the requested number of blocks is read
+        self.assertEqual(read_blocks([b'#11\x01\n', b'#11\x02\n'], 1), [[1]])
+
+    def test_sillyscope_columns_equal(self):
+        e = _m.instruments._sillyscope._columns_equal
+        x = _n.array([1.0,2.0,3.0])
+        y = _n.array([1.0,2.0,4.0])
+
+        self.assertTrue (e(dict(t=x, V=x), dict(t=x, V=x)))
+        self.assertTrue (e(dict(t=x), dict(t=x.copy())))
+        self.assertTrue (e(dict(t=[]), dict(t=[])))
+        self.assertFalse(e(dict(t=x, V=x), dict(V=x, t=x)))
+        self.assertFalse(e(dict(t=x), dict(t=x, V=x)))
+        self.assertFalse(e(dict(t=x), dict(t=x[0:2])))
+        self.assertFalse(e(dict(t=x), dict(t=y)))
+        self.assertFalse(e(dict(t=x), dict(t=_n.array([0.0,2.0,3.0]))))
+
     def test_instruments_adalm2000(self):        _m.instruments.adalm2000(block=True)
     def test_instruments_sillyscope(self):       _m.instruments.sillyscope(block=True)
     def test_instruments_keithley_dmm(self):     _m.instruments.keithley_dmm(block=True)